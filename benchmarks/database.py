@@ -0,0 +1,222 @@
+"""
+Database layer benchmarks
+---
+Runs `mlib.database` helpers against local SQLite (aiosqlite and sqlite3) with synthetic schema
+at several table sizes and reports ops/sec, latency percentiles and statements per operation.
+
+python -m benchmarks.database --sizes 100 1000 10000 --save baseline.json
+
+python -m benchmarks.database --compare baseline.json
+"""
+
+import asyncio, json, os, platform, sys, tempfile, time
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from mlib import arguments
+
+# Registered before importing anything that imports `mlib.logger`, as it parses arguments (and handles --help)
+arguments.add("--sizes", nargs="+", type=int, default=[100, 1000, 10000], help="Amounts of rows in table")
+arguments.add("--iterations", type=int, default=200, help="Operations per benchmark")
+arguments.add("--save", help="Path to save results as JSON baseline")
+arguments.add("--compare", help="Path of JSON baseline to compare results against")
+arguments.add("--threshold", type=float, default=0.1, help="Relative slowdown reported as regression")
+
+from mlib.database import ID, AsyncSQL, Base, Default, ImperativeTable, SQL, Timestamp
+from mlib.metrics import Histogram
+
+
+class BenchItem(Default, Timestamp, Base):
+    """Named row with server side timestamp"""
+
+
+class BenchRef(Base):
+    """Row consisting of just an ID, as created by `fetch_or_add_multiple` (`ID` mixin's id isn't an init field)"""
+
+    id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+
+
+class BenchCounter(ID, Timestamp, Base):
+    """Unnamed row with autoincrementing ID, used for inserts without conflicts"""
+
+
+class BenchLog(ImperativeTable, schema=None):
+    __tablename__ = "bench_log"
+    id: int = orm.mapped_column(primary_key=True)
+    message: str
+
+
+def summary(latencies: Histogram, statements: int, elapsed: float, unit: int = 1) -> dict[str, float]:
+    """Results of single benchmark. `unit` is amount of items processed by each operation"""
+    return {
+        "ops_per_sec": latencies.count * unit / elapsed,
+        "p50_ms": latencies.percentile(50) * 1000,
+        "p95_ms": latencies.percentile(95) * 1000,
+        "p99_ms": latencies.percentile(99) * 1000,
+        "statements_per_op": statements / latencies.count,
+    }
+
+
+def statement_count(db: SQL) -> int:
+    return sum(histogram.count for histogram in db.stats.statements.values())
+
+
+async def measure_async(db: AsyncSQL, operation, iterations: int, unit: int = 1) -> dict[str, float]:
+    latencies = Histogram()
+    db.stats.reset()
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        await operation(i)
+        latencies.add(time.perf_counter() - t)
+    return summary(latencies, statement_count(db), time.perf_counter() - start, unit)
+
+
+def measure_sync(db: SQL | AsyncSQL, operation, iterations: int, unit: int = 1) -> dict[str, float]:
+    latencies = Histogram()
+    db.stats.reset()
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        operation(i)
+        latencies.add(time.perf_counter() - t)
+    return summary(latencies, statement_count(db), time.perf_counter() - start, unit)
+
+
+def rows(size: int, offset: int = 0) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [{"id": i, "name": f"item {i}", "timestamp": now} for i in range(offset, offset + size)]
+
+
+async def bench_async(path: str, size: int, iterations: int) -> dict[str, dict]:
+    db = AsyncSQL(url=f"sqlite+aiosqlite:///{path}")
+    await db.create_tables()
+    db.instrument()
+    results = {}
+
+    results["bulk_ingest"] = await measure_async(
+        db, lambda i: db.upsert_many(BenchItem, rows(size, i * size)), 3, unit=size
+    )
+    await db.upsert_many(BenchRef, [{"id": i} for i in range(size)])
+
+    # Per call overhead of building statement (and it's cache key, as execution does) with filter_by
+    # compared to reusing prebuilt one from `Base.statement`
+    results["statement_filter_by"] = measure_sync(
+        db, lambda i: sa.select(BenchItem).filter_by(id=i % size)._generate_cache_key(), iterations
+    )
+    results["statement_prebuilt"] = measure_sync(
+        db, lambda i: BenchItem.statement("id")._generate_cache_key(), iterations
+    )
+
+    async with db.session() as s:
+        results["by_id_filter_by"] = await measure_async(
+            db, lambda i: s.scalar(sa.select(BenchItem).filter_by(id=i % size)), iterations
+        )
+        results["by_id"] = await measure_async(db, lambda i: BenchItem.by_id(s, i % size), iterations)
+        results["filter"] = await measure_async(db, lambda i: BenchItem.filter(s, name=f"item {i % size}"), iterations)
+        results["fetch_or_add"] = await measure_async(
+            db, lambda i: BenchItem.fetch_or_add(s, name=f"item {i % size}"), iterations
+        )
+        ids = lambda i: [(i * 100 + j) % (size * 2) for j in range(100)]  # noqa: E731
+        results["fetch_or_add_multiple"] = await measure_async(
+            db, lambda i: BenchRef.fetch_or_add_multiple(s, *ids(i)), iterations // 10, unit=100
+        )
+        await s.rollback()
+        results["fetch_or_add_multiple_bulk"] = await measure_async(
+            db, lambda i: BenchRef.fetch_or_add_multiple(s, *ids(i), bulk=True), iterations // 10, unit=100
+        )
+        await s.rollback()
+
+    async def merge_or_add(i: int):
+        async with db.session() as s:
+            existing = await BenchItem.by_id(s, i % size)
+        await db.merge_or_add(existing, BenchItem(f"merged {i}") if existing is None else existing)
+
+    results["merge_or_add"] = await measure_async(db, merge_or_add, iterations // 4)
+    results["add"] = await measure_async(db, lambda i: db.add(BenchCounter()), iterations // 4)
+    await db.close()
+    return results
+
+
+def bench_sync(path: str, size: int, iterations: int) -> dict[str, dict]:
+    db = SQL(url=f"sqlite:///{path}")
+    db.create_tables()
+    db.instrument()
+    results = {}
+
+    results["bulk_ingest"] = measure_sync(
+        db,
+        lambda i: db.upsert_many(BenchLog, [{"id": j, "message": f"log {j}"} for j in range(i * size, (i + 1) * size)]),
+        3,
+        unit=size,
+    )
+    with db.session() as s:
+        stmt = sa.select(BenchLog.__table__).where(BenchLog.__table__.c.id == sa.bindparam("id"))
+        results["by_id"] = measure_sync(db, lambda i: s.execute(stmt, {"id": i % size}).first(), iterations)
+    db._engine.dispose()
+    return results
+
+
+async def run(sizes: list[int], iterations: int) -> dict[str, dict]:
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, result in (await bench_async(os.path.join(directory, "async.db"), size, iterations)).items():
+                results[f"aiosqlite/{name}/{size}"] = result
+            for name, result in bench_sync(os.path.join(directory, "sync.db"), size, iterations).items():
+                results[f"sqlite/{name}/{size}"] = result
+    return results
+
+
+def report(results: dict[str, dict], baseline: dict[str, dict] = None, threshold: float = 0.1) -> list[str]:
+    """Prints results table, returns names of benchmarks slower than baseline by more than threshold"""
+    regressions = []
+    print(f"{'benchmark':<44}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'stmts/op':>10}{'change':>10}")
+    for name, result in results.items():
+        change = ""
+        if baseline and name in baseline:
+            ratio = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+            change = f"{ratio:+.1%}"
+            if ratio < -threshold:
+                regressions.append(name)
+        print(
+            f"{name:<44}{result['ops_per_sec']:>12.1f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+            f"{result['p99_ms']:>10.3f}{result['statements_per_op']:>10.2f}{change:>10}"
+        )
+    return regressions
+
+
+def main():
+    args = arguments.parse()
+    results = asyncio.run(run(args.sizes, args.iterations))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "meta": {
+                        "date": datetime.now(timezone.utc).isoformat(),
+                        "python": platform.python_version(),
+                        "sqlalchemy": sa.__version__,
+                        "iterations": args.iterations,
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+    if regressions:
+        print("Regressions:", ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
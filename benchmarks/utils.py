@@ -0,0 +1,302 @@
+"""
+Utility function benchmarks
+---
+python -m benchmarks.utils
+
+python -m benchmarks.utils --only replace
+"""
+
+import random, string, time
+
+from mlib import arguments
+
+arguments.add("--only", nargs="*", help="Names of benchmarks to run")
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    """Best time of `repeat` calls in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def words(amount: int, length: int = 8, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return ["".join(rng.choices(string.ascii_lowercase, k=length)) for _ in range(amount)]
+
+
+@benchmark
+def bench_replace():
+    from mlib.utils import compile_replacer, replace_multiple
+
+    text = " ".join(words(200_000, 6))
+    for patterns in [10, 100, 500]:
+        banned = words(patterns, 6, seed=1) + [w[:4] for w in words(patterns, 6, seed=2)]
+        old = measure(replace_multiple, text, banned, "***")
+        replacer = compile_replacer(banned, "***")
+        new = measure(replacer, text)
+        print(f"replace {len(text)} chars, {len(banned)} patterns: {old:.4f}s -> {new:.4f}s ({old / new:.1f}x)")
+
+
+def legacy_cc2jl(my_str):
+    r = my_str[0].lower()
+    for i, letter in enumerate(my_str[1:], 1):
+        if letter.isupper():
+            if my_str[i - 1].islower() or (i != len(my_str) - 1 and my_str[i + 1].islower()):
+                r += "_"
+        r += letter.lower()
+    return r
+
+
+@benchmark
+def bench_case():
+    from mlib import case
+
+    rng = random.Random(0)
+    names = ["".join(w.title() for w in rng.sample(words(50, 6), 3)) for _ in range(20_000)]
+    keys = [rng.choice(names) for _ in range(1_000_000)]
+    payload = [{key: None} for key in keys]
+
+    legacy = measure(lambda: case.convert_keys(payload, legacy_cc2jl), repeat=1)
+    case.cc2jl.cache_clear()
+    cold = measure(lambda: case.convert_keys(payload, case.cc2jl), repeat=1)
+    warm = measure(case.convert_keys, payload, case.cc2jl)
+    for name, elapsed in [("legacy loop", legacy), ("cold cache", cold), ("warm cache", warm)]:
+        print(f"cc2jl {len(keys)} keys ({len(names)} distinct), {name}: {elapsed / len(keys) * 1e9:.0f} ns/key")
+
+
+def payload(amount: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "name": None if i % 2 else f"item {i}",
+            "tags": [str(i), None],
+            "meta": {"a": None, "b": i, "nested": [{"c": None, "d": [i, None]}]},
+        }
+        for i in range(amount)
+    ]
+
+
+@benchmark
+def bench_remove_none():
+    import copy, io, json, tracemalloc
+
+    from mlib.utils import dump_json, remove_None
+
+    data = payload(100_000)
+    for name, func in [
+        ("in-place", remove_None),
+        ("copy", lambda d: remove_None(d, inplace=False)),
+    ]:
+        copies = [copy.deepcopy(data) for _ in range(3)]
+        elapsed = measure(lambda: func(copies.pop()))
+        print(f"remove_None {len(data)} records, {name}: {elapsed:.3f}s")
+
+    for name, func in [
+        ("json.dumps(remove_None(copy))", lambda: json.dumps(remove_None(data, inplace=False), separators=(",", ":"))),
+        ("dump_json", lambda: dump_json(data, io.StringIO())),
+    ]:
+        elapsed = measure(func, repeat=1)
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name}: {elapsed:.3f}s, peak {peak / 2**20:.1f} MiB")
+
+    deep = node = {}
+    for i in range(100_000):
+        node["child"] = {"value": None, "depth": i}
+        node = node["child"]
+    print(f"remove_None 100000 levels deep: {measure(remove_None, deep, repeat=1):.3f}s")
+
+
+@benchmark
+def bench_timed():
+    import asyncio
+
+    from mlib.metrics import reset, timed
+
+    calls = 1_000_000
+
+    def noop():
+        pass
+
+    async def anoop():
+        pass
+
+    def loop(func):
+        for _ in range(calls):
+            func()
+
+    def block():
+        for _ in range(calls):
+            with timed("block"):
+                pass
+
+    async def aloop(func):
+        for _ in range(calls):
+            await func()
+
+    base = measure(loop, noop)
+    for name, elapsed in [
+        ("@timed", measure(loop, timed(noop)) - base),
+        ("@timed(sample_rate=0.01)", measure(loop, timed("sampled", 0.01)(noop)) - base),
+        ("with timed()", measure(block) - base),
+        (
+            "async @timed",
+            measure(lambda: asyncio.run(aloop(timed(anoop)))) - measure(lambda: asyncio.run(aloop(anoop))),
+        ),
+    ]:
+        print(f"{name} overhead: {elapsed / calls * 1e9:.0f} ns/call")
+    reset()
+
+
+@benchmark
+def bench_records():
+    import re
+
+    from mlib.records import Prefix, Range, Records, Regex
+
+    rng = random.Random(0)
+    rows = [{"id": i, "name": name, "score": rng.randint(0, 100)} for i, name in enumerate(words(200_000, 6))]
+
+    def legacy(array, regex, key):
+        not_matching = []
+        for i in array:
+            if re.compile(regex).search(i[key]) is not None:
+                not_matching.append(i)
+        return not_matching
+
+    plain = Records(rows)
+    indexed = Records(rows, index=["id"], sorted_index=["name", "score"])
+    parallel = Records(rows, processes=4, chunk_size=50_000)
+    for name, func in [
+        ("legacy filtr regex", lambda: legacy(rows, "^abc", "name")),
+        ("scan regex", lambda: list(plain.filter(name=Regex("^abc")))),
+        ("parallel scan regex", lambda: list(parallel.filter(name=Regex("^abc")))),
+        ("indexed prefix", lambda: list(indexed.filter(name=Prefix("abc")))),
+        ("scan prefix+range", lambda: list(plain.filter(name=Prefix("a"), score=Range(10, 12)))),
+        ("indexed prefix+range", lambda: list(indexed.filter(name=Prefix("a"), score=Range(10, 12)))),
+        ("indexed equality", lambda: list(indexed.filter(id=12345))),
+    ]:
+        print(f"records {len(rows)}, {name}: {measure(func) * 1000:.3f}ms")
+
+
+def legacy_all_subclasses(cls) -> set:
+    return set(cls.__subclasses__()).union([s for c in cls.__subclasses__() for s in legacy_all_subclasses(c)])
+
+
+@benchmark
+def bench_subclasses():
+    from mlib.classes import Registry, subclasses
+
+    lookups = 100
+    for depth, width in [(6, 4), (400, 10)]:
+        for root, method in [
+            (type("Plain", (), {}), "iterative walk"),
+            (type("Registered", (Registry,), {}), "registry"),
+        ]:
+            level, classes = [root], []
+            for d in range(depth):
+                # Full tree for shallow hierarchy, spine with `width` leaves per level for deep one
+                parents = level if depth < 10 else level[:1]
+                level = [type(f"C{d}_{i}", (parent,), {}) for parent in parents for i in range(width)]
+                classes.extend(level)
+            amount = len(subclasses(root))
+            for name, func in [("legacy recursive", legacy_all_subclasses), (method, subclasses)]:
+                try:
+                    elapsed = measure(lambda: [func(root) for _ in range(lookups)])
+                except RecursionError:
+                    print(f"{amount} classes, depth {depth}, {name}: RecursionError")
+                    continue
+                print(f"{amount} classes, depth {depth}, {name}: {elapsed / lookups * 1e6:.1f} us/lookup")
+
+
+@benchmark
+def bench_localization():
+    import os, tempfile
+
+    import i18n
+
+    from mlib import localization
+
+    calls = 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        for lang in ("en", "pl"):
+            with open(os.path.join(directory, f"{lang}.yml"), "w", encoding="utf-8") as file:
+                file.write('greeting: "Hello %{name}, you have %{count} messages"\nplain: "Plain text"\n')
+                file.write('apples:\n  one: "%{count} apple"\n  few: "%{count} apples"\n  many: "%{count} apples"\n')
+        i18n.load_path.append(directory)
+        i18n.set("filename_format", "{namespace}.{format}")
+        i18n.set("skip_locale_root_data", True)
+        localization.clear_cache()
+        for key, kwargs in [("plain", {}), ("greeting", {"name": "user", "count": 5}), ("apples", {"count": 22})]:
+            old = measure(lambda: [i18n.t(f"pl.{key}", **kwargs) for _ in range(calls)])
+            new = measure(lambda: [localization.tr(key, "pl", **kwargs) for _ in range(calls)])
+            print(f"tr {key}: i18n.t {old / calls * 1e6:.2f} us -> {new / calls * 1e6:.2f} us")
+        i18n.load_path.remove(directory)
+
+    rng = random.Random(0)
+    durations = [rng.randint(0, 10**6) for _ in range(calls)]
+    for lang in ("EN", "PL", "RU"):
+        uncached = measure(lambda: [localization._seconds_to_text.__wrapped__(secs, lang) for secs in durations])
+        localization.clear_cache()
+        cold = measure(localization.format_durations, durations, lang, repeat=1)
+        warm = measure(localization.format_durations, durations, lang)
+        print(
+            f"format_durations {calls} {lang}: uncached {uncached / calls * 1e6:.2f} us, "
+            f"cold cache {cold / calls * 1e6:.2f} us, warm cache {warm / calls * 1e6:.2f} us per duration"
+        )
+    repeated = [secs % 3600 for secs in durations]
+    elapsed = measure(localization.format_durations, repeated, "EN")
+    print(f"format_durations {calls} EN (3600 distinct): {elapsed / calls * 1e6:.2f} us per duration")
+
+
+@benchmark
+def bench_directories():
+    import glob, os, tempfile
+    from mlib.directories import DirectoryIndex
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as root:
+        directories = [root]
+        for i in range(1_000):
+            directories.append(os.path.join(rng.choice(directories), f"d{i}"))
+            os.mkdir(directories[-1])
+        for i in range(30_000):
+            open(os.path.join(rng.choice(directories), f"f{i}.txt"), "w").close()
+        # Directories modified less than RACY_NS ago would be rescanned
+        time.sleep(2.1)
+
+        scan = measure(lambda: glob.glob(f"{root}/**/*", recursive=True))
+        index = DirectoryIndex(root)
+        cold = measure(lambda: index.refresh(full=True))
+        warm = measure(index.refresh)
+        persisted = os.path.join(root, "index")
+        index.save(persisted)
+        loaded = measure(lambda: DirectoryIndex.load(persisted).refresh())
+        print(
+            f"index {len(index)} files in {len(directories)} directories: glob {scan:.3f}s, "
+            f"cold {cold:.3f}s, warm {warm:.3f}s, load + refresh {loaded:.3f}s"
+        )
+
+
+def main():
+    args = arguments.parse()
+    for name, func in BENCHMARKS.items():
+        if not args.only or name in args.only:
+            func()
+
+
+if __name__ == "__main__":
+    main()
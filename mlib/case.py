@@ -0,0 +1,127 @@
+"""
+Case conversion
+---
+Conversions use precompiled patterns or translate tables for ASCII strings (falling back to per character loop
+otherwise) and remember up to `CACHE_SIZE` recent results, as the same names tend to repeat a lot.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable
+
+CACHE_SIZE = 65536
+
+JOINT_LOWER = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=.)(?=[A-Z][a-z])", re.S)
+"""Positions before uppercase letter that follows lowercase one or starts a word (like `R` in `HTTPRequest`)"""
+JOINT_PRESERVING = re.compile(r"""(?<=[a-z])(?=[A-Z](?:[^_"']|\Z))|(?<=[^_"'])(?=[A-Z][a-z])""", re.S)
+"""Same as `JOINT_LOWER` but not next to underscore or quote"""
+QUOTES = {"_", '"', "'"}
+
+
+def _cc2jl(my_str: str) -> str:
+    last = len(my_str) - 1
+    r = [my_str[0].lower()]
+    for i in range(1, len(my_str)):
+        letter = my_str[i]
+        if letter.isupper() and (my_str[i - 1].islower() or (i != last and my_str[i + 1].islower())):
+            r.append("_")
+        r.append(letter.lower())
+    return "".join(r)
+
+
+def _cc2jp(my_str: str) -> str:
+    last = len(my_str) - 1
+    r = [my_str[0]]
+    for i in range(1, len(my_str)):
+        letter = my_str[i]
+        if (
+            letter.isupper()
+            and (my_str[i - 1].islower() or (i != last and my_str[i + 1].islower()))
+            and my_str[i - 1] not in QUOTES
+            and (i == last or my_str[i + 1] not in QUOTES)
+        ):
+            r.append("_")
+        r.append(letter)
+    return "".join(r).strip("_")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cc2jl(my_str: str) -> str:
+    """CamelCase to joint_lower"""
+    if my_str.isascii():
+        return JOINT_LOWER.sub("_", my_str).lower()
+    return _cc2jl(my_str)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_cc2jp(my_str: str) -> str:
+    if my_str.isascii():
+        return JOINT_PRESERVING.sub("_", my_str).strip("_")
+    return _cc2jp(my_str)
+
+
+def cc2jp(my_str) -> str:
+    """CamelCase to joint_lower_Preserving_Uppercase"""
+    return _cached_cc2jp(str(my_str))
+
+
+@lru_cache(maxsize=64)
+def _separators(separator: str) -> dict[int, str]:
+    return str.maketrans({" ": separator, "-": separator, "_": separator})
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_case(my_str: str, separator: str) -> str:
+    """String to-any_case"""
+    if len(separator) > 1 and any(char in separator for char in " -_"):
+        return my_str.replace(" ", separator).replace("-", separator).replace("_", separator)
+    return my_str.translate(_separators(separator))
+
+
+SNAKE = str.maketrans({" ": "_", "-": "_"})
+KEBAB = str.maketrans({" ": "-", "_": "-"})
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_snake(my_str: str) -> str:
+    """String to snake_case"""
+    return my_str.translate(SNAKE).lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_kebab(my_str: str) -> str:
+    """String to kebab-case"""
+    return my_str.translate(KEBAB).lower()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cc2snake(my_str: str) -> str:
+    """CamelCase (or words separated by spaces or hyphens) to snake_case"""
+    return to_snake(cc2jl(my_str))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cc2kebab(my_str: str) -> str:
+    """CamelCase (or words separated by spaces or underscores) to kebab-case"""
+    return to_kebab(cc2jl(my_str))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_camel(my_str: str, default_separator: str = "_") -> str:
+    """snake_case (or any other by changing default separator) to CamelCase"""
+    return "".join(i.title() for i in my_str.split(default_separator))
+
+
+def convert_keys(obj: Any, case: Callable[[str], str]) -> Any:
+    """Returns copy of nested dicts and lists with string keys converted by `case`
+    (function or object with `convert` method, like `Case_Separators` member)"""
+    convert = getattr(case, "convert", case)
+
+    def walk(value):
+        if type(value) is dict:
+            return {
+                convert(k) if type(k) is str else k: walk(v) if type(v) in (dict, list) else v for k, v in value.items()
+            }
+        return [walk(v) if type(v) in (dict, list) else v for v in value]
+
+    return walk(obj) if type(obj) in (dict, list) else obj
@@ -0,0 +1,99 @@
+"""
+Chunking
+---
+Splits (async) iterables into lists without materializing them first
+and byte buffers into `memoryview` slices without copying.
+
+for batch in chunked(rows, 1000):
+    ...
+
+async for batch in achunked(events, 100, max_latency=0.5):
+    ...
+"""
+
+import asyncio, time
+from itertools import islice
+from typing import AsyncIterable, Callable, Iterable, Iterator, AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    """Lists of up to `n` consecutive items. Last one is shorter instead of padded"""
+    if n < 1:
+        raise ValueError("Chunk size must be at least 1")
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, n)):
+        yield chunk
+
+
+def chunked_by(
+    iterable: Iterable[T], max_weight: float, weight: Callable[[T], float] = len, max_items: int = None
+) -> Iterator[list[T]]:
+    """Lists of consecutive items with total `weight` (like length in bytes or characters) up to `max_weight`
+    and optionally up to `max_items` items. Item heavier than `max_weight` is yielded on it's own"""
+    chunk, total = [], 0
+    for item in iterable:
+        item_weight = weight(item)
+        if chunk and (total + item_weight > max_weight or len(chunk) == max_items):
+            yield chunk
+            chunk, total = [], 0
+        chunk.append(item)
+        total += item_weight
+    if chunk:
+        yield chunk
+
+
+async def achunked(iterable: AsyncIterable[T], n: int, max_latency: float = None) -> AsyncIterator[list[T]]:
+    """Lists of up to `n` consecutive items of async iterable.
+    With `max_latency` (in seconds) incomplete chunk is yielded once it's first item waited that long"""
+    if n < 1:
+        raise ValueError("Chunk size must be at least 1")
+    iterator = aiter(iterable)
+    chunk = []
+    if max_latency is None:
+        async for item in iterator:
+            chunk.append(item)
+            if len(chunk) == n:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        return
+
+    # Item being awaited survives timeouts, so nothing is lost when flushing early
+    pending = asyncio.ensure_future(anext(iterator))
+    deadline = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if done:
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    break
+                pending = asyncio.ensure_future(anext(iterator))
+                if not chunk:
+                    deadline = time.monotonic() + max_latency
+                chunk.append(item)
+                if len(chunk) < n:
+                    continue
+            if chunk:
+                yield chunk
+            chunk, deadline = [], None
+        if chunk:
+            yield chunk
+    finally:
+        if not pending.done():
+            pending.cancel()
+
+
+def chunked_bytes(data: bytes | bytearray | memoryview, size: int) -> Iterator[memoryview]:
+    """`memoryview` slices of up to `size` bytes sharing buffer of `data` (no copies are made).
+    Resizing `bytearray` is not possible while slices are alive"""
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1")
+    view = memoryview(data).cast("B")
+    for start in range(0, len(view), size):
+        yield view[start : start + size]
@@ -10,3 +10,50 @@ def reopen(cls):
             setattr(cls, name, obj)
 
     return dec
+
+
+class Registry:
+    """Keeps transitive set of subclasses (and index of their names) on each class deriving from it,
+    updated by `__init_subclass__` when new subclass is defined, so lookups don't walk hierarchy.
+    Registered subclasses are referenced strongly"""
+
+    _subclasses: set[type] = set()
+    _names: dict[str, type] = {}
+    _frozen: frozenset[type] | None = None
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._subclasses = set()
+        cls._names = {}
+        cls._frozen = None
+        for base in cls.__mro__[1:]:
+            if "_subclasses" in vars(base):
+                base._subclasses.add(cls)
+                base._names[cls.__name__] = cls
+                base._frozen = None
+
+    @classmethod
+    def subclasses(cls) -> frozenset[type]:
+        """All (transitive) subclasses"""
+        if cls._frozen is None:
+            cls._frozen = frozenset(cls._subclasses)
+        return cls._frozen
+
+    @classmethod
+    def subclass(cls, name: str) -> type | None:
+        """Subclass by it's name. If names repeat, the most recently defined one is returned"""
+        return cls._names.get(name)
+
+
+def subclasses(cls: type) -> frozenset[type]:
+    """All (transitive) subclasses of class, from `Registry` if it's registered or by walking hierarchy otherwise"""
+    if "_subclasses" in vars(cls) and issubclass(cls, Registry):
+        return cls.subclasses()
+    found = set()
+    stack = [cls]
+    while stack:
+        for subclass in type.__subclasses__(stack.pop()):
+            if subclass not in found:
+                found.add(subclass)
+                stack.append(subclass)
+    return frozenset(found)
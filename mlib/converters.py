@@ -1,34 +1,85 @@
 from datetime import timedelta
+from functools import lru_cache
+from typing import Iterable
 import re
+
 UNITS = {
-    "seconds": ["s", "sec", "second"],
-    "month":  ["month"], 
-    "minutes": ["m", "min", "minute"], 
-    "hours":   ["h", "hour"],
-    "days":    ["d", "day"], 
-    "weeks":   ["w", "week"], 
-    "year":   ["year"]
+    "seconds": ["s", "sec", "secs", "second", "seconds"],
+    "month": ["month", "months"],
+    "minutes": ["m", "min", "mins", "minute", "minutes"],
+    "hours": ["h", "hr", "hrs", "hour", "hours"],
+    "days": ["d", "day", "days"],
+    "weeks": ["w", "week", "weeks"],
+    "year": ["year", "years"],
+}
+UNIT_SECONDS = {
+    "seconds": 1,
+    "minutes": 60,
+    "hours": 60 * 60,
+    "days": 24 * 60 * 60,
+    "weeks": 7 * 24 * 60 * 60,
+    "month": 30 * 24 * 60 * 60,
+    "year": 365 * 24 * 60 * 60,
 }
+"""Length of unit in seconds (month is 30 days, year is 365 days)"""
+ALIAS_SECONDS = {alias: UNIT_SECONDS[unit] for unit, aliases in UNITS.items() for alias in aliases}
 DIGITS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
-digits = "|".join(f"{i}" for i in DIGITS)
-units = "|".join(r"(?P<{}>{})".format(i, "|".join(value)) for i, value in UNITS.items())
-TIME_UNITS = re.compile(r"(?i)(?P<value>[\d\.,]+) ?(?P<unit>{})".format(units))
-
-def total_seconds(duration: str) -> timedelta:
-    total = timedelta()
-    for d in TIME_UNITS.finditer(duration):
-        interval, unit = d.group("value"), [i for i in filter(lambda x: x[1], d.groupdict().items())][-1][0]
-        interval = interval.replace(',','.')
-        if interval == '.':
-            continue
-        if interval.isalpha():
-            interval = DIGITS.index(interval.lower())
-        interval = float(interval)
-        if unit == 'month':
-            interval *= 30
-            unit = "days"
-        elif unit == "year":
-            interval *=365
-            unit = "days"
-        total += timedelta(**{unit: interval})
+DIGIT_VALUES = {digit: float(value) for value, digit in enumerate(DIGITS)}
+
+digits = "|".join(sorted(DIGITS, key=len, reverse=True))
+# Longest aliases first, so whole word is consumed (and `month` wins over `m`)
+units = "|".join(sorted(ALIAS_SECONDS, key=len, reverse=True))
+# Spelled out numbers have to be whole words followed by whole unit, so words like `eighth` or `tens` don't match.
+# Numbers start with a digit, or with a decimal point that doesn't follow other text, so `1h,30m` keeps it's comma as separator
+TIME_UNITS = re.compile(
+    r"(?i)(?P<value>\d+(?:[.,]\d+)*[.,]?|(?<![\w.,])[.,]\d+(?:[.,]\d+)*|\b(?P<word>{})\b) ?(?P<unit>{})(?(word)\b)".format(
+        digits, units
+    )
+)
+SEPARATORS = re.compile(r"(?i)(?:\s|,|;|\band\b)*")
+"""Text allowed between durations in strict mode"""
+
+
+class DurationError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=65536)
+def seconds(duration: str, strict: bool = False) -> float:
+    """Total seconds in durations like `1h 30m`, `2 days, 5 hours` or `one week`.
+    Raises `DurationError` for malformed numbers and, if `strict`, for any text that isn't duration
+    (text around durations is ignored otherwise). Results are cached as the same strings tend to repeat"""
+    total = 0.0
+    end = 0
+    for match in TIME_UNITS.finditer(duration):
+        if strict and not SEPARATORS.fullmatch(duration, end, match.start()):
+            raise DurationError(f"Unexpected {duration[end : match.start()]!r} in duration {duration!r}")
+        end = match.end()
+        value = match.group("value").lower()
+        if (number := DIGIT_VALUES.get(value)) is None:
+            value = value.replace(",", ".")
+            try:
+                number = float(value)
+            except ValueError:
+                raise DurationError(f"Malformed number {match.group('value')!r} in duration {duration!r}") from None
+        total += number * ALIAS_SECONDS[match.group("unit").lower()]
+    if strict and not end:
+        raise DurationError(f"No duration found in {duration!r}")
+    if strict and not SEPARATORS.fullmatch(duration, end):
+        raise DurationError(f"Unexpected {duration[end:]!r} in duration {duration!r}")
     return total
+
+
+def total_seconds(duration: str, strict: bool = False) -> timedelta:
+    """Duration as timedelta, see `seconds`"""
+    return timedelta(seconds=seconds(duration, strict))
+
+
+def parse_many(durations: Iterable[str], strict: bool = False, as_array: bool = False):
+    """Parses many durations, returning list of timedeltas or (with `as_array`) NumPy array of seconds"""
+    if as_array:
+        import numpy as np
+
+        count = len(durations) if hasattr(durations, "__len__") else -1
+        return np.fromiter((seconds(duration, strict) for duration in durations), dtype=np.float64, count=count)
+    return [timedelta(seconds=seconds(duration, strict)) for duration in durations]
@@ -1,21 +1,103 @@
-import enum
-from datetime import datetime
+import asyncio, base64, enum, hashlib, json, os, random, re, time, uuid
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from functools import lru_cache
+from datetime import date, datetime
 from inspect import isclass
-from typing import Annotated, Type, TypeVar, get_args, get_origin
+from itertools import chain
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Type,
+    TypeVar,
+    get_args,
+    get_origin,
+)
 
 import sqlalchemy as sa
 from sqlalchemy import Select, orm, select
-from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine, AsyncAttrs
 from sqlalchemy.sql.sqltypes import _type_map as SQL_TYPES
 from mlib.logger import log
+from mlib.metrics import BENCHMARK, Histogram
+from mlib.chunking import chunked
+from mlib.utils import chunks
 
 T = TypeVar("T", bound=Type["Base"])
 V = TypeVar("V")
 
 
+CHANGED_MODELS = "mlib_changed_models"
+"""Key in `Session.info` with models changed in current transaction"""
+
+
+class Session(orm.Session):
+    """Session tracking which models were changed within transaction to evict their caches on commit.
+    If replicas are provided, SELECTs outside of explicit transactions are sent to one of them
+    (chosen once per transaction, so it reads from single snapshot),
+    until session flushes or executes any other statement, after which it stays on primary"""
+
+    def __init__(self, *args, replicas: list[Engine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas or []
+        self.replica: Engine = None
+        self.on_primary = False
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self.replicas and not self.on_primary:
+            if (
+                self._flushing
+                or not isinstance(clause, sa.Select)
+                or (self._transaction and self._transaction.origin is not orm.SessionTransactionOrigin.AUTOBEGIN)
+            ):
+                self.on_primary = True
+            else:
+                if self.replica is None:
+                    self.replica = random.choice(self.replicas)
+                return self.replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+@sa.event.listens_for(Session, "after_transaction_end")
+def _release_replica(session: Session, transaction: orm.SessionTransaction):
+    if transaction.parent is None:
+        session.replica = None
+
+
+@sa.event.listens_for(Session, "after_flush")
+def _track_flushed(session: Session, flush_context):
+    changed = session.info.setdefault(CHANGED_MODELS, set())
+    changed.update(type(obj) for obj in chain(session.new, session.dirty, session.deleted))
+
+
+@sa.event.listens_for(Session, "do_orm_execute")
+def _track_executed(orm_execute_state: orm.ORMExecuteState):
+    if orm_execute_state.is_select or not (mapper := orm_execute_state.bind_mapper):
+        return
+    orm_execute_state.session.info.setdefault(CHANGED_MODELS, set()).add(mapper.class_)
+
+
+@sa.event.listens_for(Session, "after_commit")
+def _evict_changed(session: Session):
+    for model in session.info.pop(CHANGED_MODELS, ()):
+        evict(model)
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def _discard_changed(session: Session):
+    session.info.pop(CHANGED_MODELS, None)
+
+
 class ASession(AsyncSession):
+    sync_session_class = Session
+
     async def query(self, statement: Select[V], index: int = 0, **kwargs) -> V:
         r = await self.execute(statement, **kwargs)
         return r.scalars(index).all()
@@ -24,8 +106,341 @@ class ASession(AsyncSession):
         r = await self.execute(statement, **kwargs)
         return r.scalar()
 
+    async def stream_batches(
+        self,
+        statement: Select[V],
+        params=None,
+        *,
+        batch_size: int = 1000,
+        partitions: bool = False,
+        index: int = 0,
+        **kwargs,
+    ) -> AsyncIterator[V | list[V]]:
+        """Async iterator over scalars fetched from server side cursor `batch_size` rows at a time
+
+        :param partitions: Yield lists of up to `batch_size` rows instead of single rows
+        """
+        result = await self.stream(statement.execution_options(yield_per=batch_size), params, **kwargs)
+        scalars = result.scalars(index)
+        try:
+            if partitions:
+                async for partition in scalars.partitions():
+                    yield partition
+            else:
+                async for row in scalars:
+                    yield row
+        finally:
+            await result.close()
+
 
 SCHEMAS = {}
+CACHES: dict[Type["Base"], "ModelCache"] = {}
+STATEMENTS: dict[tuple[Type["Base"], Hashable], Select] = {}
+DEFAULT_CACHE_SIZE = 1024
+BIND_PARAMS_LIMIT = 999
+"""Maximum amount of bound parameters sent in a single statement (SQLite's lowest default)"""
+
+
+def dialect_insert(dialect: str, table) -> sa.Insert:
+    """Creates INSERT for specified dialect name, so dialect specific clauses (like `ON CONFLICT`) are available"""
+    match dialect:
+        case "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        case "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        case _:
+            from sqlalchemy import insert
+    return insert(table)
+
+
+def upsert_statement(
+    dialect: str, table: sa.Table, conflict_keys: list[str], update_columns: list[str] = None
+) -> sa.Insert:
+    """Creates `INSERT ... ON CONFLICT` updating `update_columns` (or doing nothing if there are none)"""
+    stmt = dialect_insert(dialect, table)
+    if not hasattr(stmt, "on_conflict_do_update"):
+        raise NotImplementedError(f"Upsert is not supported for {dialect} dialect")
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=conflict_keys)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_keys, set_={column: stmt.excluded[column] for column in update_columns}
+    )
+
+
+def upsert_batches(
+    dialect: str,
+    model: Type["Base"],
+    rows: Iterable[dict],
+    conflict_keys: list[str] = None,
+    update_columns: list[str] = None,
+    batch_size: int = 1000,
+) -> Iterator[tuple[sa.Insert, list[dict]]]:
+    """Splits rows into batches along with upsert statement for them.
+    Defaults to conflicts on primary key and updating remaining columns present in first row"""
+    table = model.__table__
+    conflict_keys = conflict_keys or [column.name for column in table.primary_key]
+    stmt = None
+    for batch in chunked(rows, batch_size):
+        if stmt is None:
+            if update_columns is None:
+                update_columns = [column for column in batch[0] if column not in conflict_keys]
+            stmt = upsert_statement(dialect, table, conflict_keys, update_columns)
+        yield stmt, batch
+
+
+class ModelCache:
+    """LRU cache of detached row snapshots with optional TTL (in seconds)"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        # Incremented on each `clear`, so rows queried before it aren't stored afterwards
+        self.generation = 0
+        self._rows: OrderedDict[Hashable, tuple[float | None, "Base"]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: Hashable) -> "Base | None":
+        """Returns cached snapshot or None if it's missing or expired"""
+        if (entry := self._rows.get(key)) is None:
+            self.misses += 1
+            return None
+        expires, row = entry
+        if expires is not None and expires < time.monotonic():
+            del self._rows[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._rows.move_to_end(key)
+        self.hits += 1
+        return row
+
+    def set(self, key: Hashable, row: "Base"):
+        """Stores snapshot under key, evicting least recently used entries above `max_size`"""
+        self._rows[key] = (time.monotonic() + self.ttl if self.ttl else None, row)
+        self._rows.move_to_end(key)
+        while self.max_size and len(self._rows) > self.max_size:
+            self._rows.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.generation += 1
+        self.evictions += len(self._rows)
+        self._rows.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._rows), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def evict(model: Type["Base"]):
+    """Clears cached rows of model (and models it inherits from)"""
+    for cls in model.__mro__:
+        if (cache := CACHES.get(cls)) is not None:
+            cache.clear()
+
+
+def snapshot(row: "Base") -> "Base":
+    """Creates detached copy of loaded column values of persistent row"""
+    state = sa.inspect(row)
+    copy = state.mapper.class_manager.new_instance()
+    for attr in state.mapper.column_attrs:
+        if attr.key in state.dict:
+            orm.attributes.set_committed_value(copy, attr.key, state.dict[attr.key])
+    orm.make_transient_to_detached(copy)
+    return copy
+
+
+def statement_key(stmt: sa.Executable) -> Hashable | None:
+    """Hashable key of statement structure along with it's parameter values.
+    None if statement can't be cached (like when it uses `TypeDecorator` without `cache_ok`)"""
+    if (cache_key := stmt._generate_cache_key()) is None:
+        return None
+    return cache_key.key, tuple(param.effective_value for param in cache_key.bindparams)
+
+
+async def attach(session: ASession, row: "Base") -> "Base":
+    """Returns instance of detached row within session without querying database"""
+    if (existing := session.identity_map.get(sa.inspect(row).key)) is not None:
+        return existing
+    return await session.merge(row, load=False)
+
+
+class Flight:
+    """Query in progress shared by concurrent callers"""
+
+    __slots__ = ("future", "followers")
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+IN_FLIGHT: dict[Hashable, Flight] = {}
+CREATING: dict[Hashable, tuple[Session, "Base", asyncio.Future]] = {}
+"""Rows created by `fetch_or_add` within transactions that didn't end yet, by engine and lookup key.
+Futures are resolved once creating transaction ends"""
+CREATED_KEYS = "mlib_created_keys"
+"""Key in `Session.info` with keys of `CREATING` rows created by session's current transaction"""
+
+
+@sa.event.listens_for(Session, "after_transaction_end")
+def _release_created(session: Session, transaction: orm.SessionTransaction):
+    if transaction.parent is not None:
+        return
+    for key in session.info.pop(CREATED_KEYS, ()):
+        if (entry := CREATING.get(key)) is not None and entry[0] is session:
+            del CREATING[key]
+            entry[2].set_result(None)
+
+
+def shareable(session: ASession, row: "Base | None") -> bool:
+    """Whether result can be shared with other sessions, which is only the case when it doesn't depend
+    on anything uncommitted: session didn't write anything within current transaction and row isn't new or modified"""
+    if session.info.get(CHANGED_MODELS) or session.sync_session.new or session.sync_session.dirty:
+        return False
+    return row is None or sa.inspect(row).persistent
+
+
+async def coalesce(session: ASession, key: Hashable | None, query: Callable[[], Awaitable["Base | None"]]):
+    """Runs query once for concurrent callers using same key and engine.
+    Callers from the same session receive the same object (even if it's pending),
+    callers from other sessions receive it's snapshot attached to their own session if it's `shareable`
+    and run query themselves otherwise"""
+    if key is None:
+        return await query()
+    key = (session.bind, key)
+
+    if (flight := IN_FLIGHT.get(key)) is not None:
+        flight.followers += 1
+        try:
+            leader, row, shared, copy = await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if not flight.future.cancelled():
+                raise
+            return await coalesce(session, key[1], query)
+        if leader is session:
+            return row
+        if not shared:
+            return await coalesce(session, key[1], query)
+        return await attach(session, copy) if copy is not None else None
+
+    flight = IN_FLIGHT[key] = Flight()
+    try:
+        row = await query()
+    except asyncio.CancelledError:
+        flight.future.cancel()
+        raise
+    except Exception as ex:
+        if flight.followers:
+            flight.future.set_exception(ex)
+        raise
+    finally:
+        del IN_FLIGHT[key]
+    if flight.followers:
+        shared = shareable(session, row)
+        flight.future.set_result((session, row, shared, snapshot(row) if shared and row is not None else None))
+    return row
+
+
+def hashable(*parts) -> tuple | None:
+    """Key made of parts (with dicts turned into frozensets of their items) or None if it can't be hashed"""
+    try:
+        key = tuple(frozenset(part.items()) if type(part) is dict else part for part in parts)
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+CURSOR_TYPES: dict[str, Callable[[str], Any]] = {
+    "$dt": datetime.fromisoformat,
+    "$d": date.fromisoformat,
+    "$u": uuid.UUID,
+    "$n": Decimal,
+    "$e": str,
+}
+"""Decoders of values that JSON can't represent by their tag in pagination cursor.
+Enum members are decoded to their names, which is what `sa.Enum` stores and accepts"""
+
+
+def _encode_cursor_value(value: Any) -> dict[str, str]:
+    if isinstance(value, (datetime, date)):
+        return {"$dt" if isinstance(value, datetime) else "$d": value.isoformat()}
+    if isinstance(value, uuid.UUID):
+        return {"$u": str(value)}
+    if isinstance(value, Decimal):
+        return {"$n": str(value)}
+    if isinstance(value, enum.Enum):
+        return {"$e": value.name}
+    raise TypeError(f"Value {value!r} of type {type(value).__name__} can't be encoded in pagination cursor")
+
+
+def _decode_cursor_value(value: dict) -> Any:
+    if len(value) == 1 and (tag := next(iter(value))) in CURSOR_TYPES:
+        return CURSOR_TYPES[tag](value[tag])
+    return value
+
+
+def encode_cursor(values: list) -> str:
+    """Encodes values of ordering columns into opaque pagination token.
+    Raises `TypeError` for values other than JSON types, dates, UUIDs, Decimals and Enums"""
+    values = json.dumps(values, separators=(",", ":"), default=_encode_cursor_value)
+    return base64.urlsafe_b64encode(values.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    """Decodes values encoded with `encode_cursor`"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)), object_hook=_decode_cursor_value)
+    except (ValueError, TypeError, ArithmeticError) as ex:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from ex
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid pagination cursor: {token!r}")
+    return values
+
+
+def comparable(expression: sa.ColumnElement, type_: sa.types.TypeEngine, dialect: str) -> sa.ColumnElement:
+    """Expression ordered and compared consistently regardless of how it's value was written.
+    SQLite keeps dates as text in format of whoever wrote them (server default has no fractional seconds,
+    unlike bound values), so they are compared through `julianday` there"""
+    if dialect == "sqlite" and isinstance(type_, (sa.Date, sa.DateTime)):
+        return sa.func.julianday(expression)
+    return expression
+
+
+def nullable(column: sa.ColumnElement) -> bool:
+    """Whether column can be NULL. Expressions other than columns are assumed to be"""
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def seek_order(columns: list[tuple[sa.ColumnElement, bool, bool]]) -> list[sa.ColumnElement]:
+    """ORDER BY clauses of (column, descending, nullable) triples, with NULLs ordered after all values
+    (last in ascending and first in descending order) by sorting on `IS NULL` first, which works on every dialect"""
+    clauses = []
+    for column, descending, can_be_null in columns:
+        if can_be_null:
+            clauses.append(column.is_(None).desc() if descending else column.is_(None))
+        clauses.append(column.desc() if descending else column)
+    return clauses
+
+
+def seek_condition(columns: list[tuple[sa.ColumnElement, bool, bool]], values: list) -> sa.ColumnElement[bool]:
+    """Condition selecting rows positioned after values (None for NULL) in `seek_order` of columns"""
+    conditions, preceding = [], []
+    for (column, descending, can_be_null), value in zip(columns, values):
+        if value is None:
+            # NULL is after every value, so only non NULL values are after it in descending order
+            after = column.is_not(None) if descending else sa.false()
+            preceding.append(column.is_(None))
+        else:
+            after = column < value if descending else column > value
+            if can_be_null and not descending:
+                after = sa.or_(after, column.is_(None))
+            preceding.append(column == value)
+        conditions.append(sa.and_(*preceding[:-1], after))
+    return sa.or_(*conditions)
 
 
 class Base(orm.MappedAsDataclass, AsyncAttrs, orm.DeclarativeBase):
@@ -35,23 +450,126 @@ class Base(orm.MappedAsDataclass, AsyncAttrs, orm.DeclarativeBase):
 
     @classmethod
     async def fetch_or_add(cls: T, session: ASession, **kwargs) -> T:
-        """Fetch from database or create new object"""
-        if row := await session.scalar(select(cls).filter_by(**kwargs)):
-            return row
-        instance = cls(**kwargs)
-        session.add(instance)
-        return instance
+        """Fetch from database or create new object.
+        While object created by one session isn't committed, other sessions looking it up wait
+        until that transaction ends (and then fetch it or create it themselves if it was rolled back),
+        so session creating row shouldn't wait for another one looking up the same row"""
+        key = hashable(cls, "fetch_or_add", kwargs)
+
+        async def fetch_or_create():
+            while True:
+                if row := await session.scalar(*cls._filter_by(kwargs)):
+                    return row
+                if key is None or (entry := CREATING.get((session.bind, key))) is None:
+                    break
+                owner, instance, created = entry
+                if owner is session.sync_session:
+                    return instance
+                await asyncio.shield(created)
+            instance = cls(**kwargs)
+            session.add(instance)
+            if key is not None:
+                CREATING[(session.bind, key)] = (
+                    session.sync_session,
+                    instance,
+                    asyncio.get_running_loop().create_future(),
+                )
+                session.info.setdefault(CREATED_KEYS, []).append((session.bind, key))
+            return instance
+
+        return await coalesce(session, key, fetch_or_create)
 
     @classmethod
     async def filter(cls: T, session: ASession, *args, **kwargs) -> list[T]:
         """:param kwargs: Column = Value"""
-        stmt = select(cls).filter(*args).filter_by(**kwargs)
+        stmt, params = cls._filter_by(kwargs, *args)
         log.log(5, "SQL Filter statement %s", stmt)
-        result = await session.scalars(stmt)
+        result = await session.scalars(stmt, params)
         return result.all()
 
     @classmethod
-    async def fetch_or_add_multiple(cls: T, session: ASession, *ids: int) -> list[T]:
+    async def iter_filter(
+        cls: T, session: ASession, *args, batch_size: int = 1000, partitions: bool = False, **kwargs
+    ) -> AsyncIterator[T | list[T]]:
+        """Like `filter` but streams rows instead of loading all of them at once. See `ASession.stream_batches`"""
+        stmt, params = cls._filter_by(kwargs, *args)
+        async for row in session.stream_batches(stmt, params, batch_size=batch_size, partitions=partitions):
+            yield row
+
+    @classmethod
+    async def paginate(
+        cls: T, session: ASession, *filters, order_by: list = None, page_size: int = 100, after: str = None
+    ) -> tuple[list[T], str | None]:
+        """Returns page of rows seeking past `after` cursor instead of using OFFSET, along with cursor of next page
+        (None if it's the last page)
+
+        :param order_by: Columns, `sa.desc(column)` or names (prefixed with `-` for descending order).
+            Primary key is appended as tie breaker. Defaults to primary key.
+            NULLs are ordered after all values, as if they were greater than any of them
+        """
+        columns = cls._keyset(order_by)
+        dialect = session.bind.dialect.name
+        ordering = [(comparable(column, column.type, dialect), desc, nullable(column)) for column, desc in columns]
+        stmt = select(cls).filter(*filters).order_by(*seek_order(ordering))
+        if after:
+            values = [
+                None if value is None else comparable(sa.literal(value, column.type), column.type, dialect)
+                for (column, _), value in zip(columns, decode_cursor(after))
+            ]
+            stmt = stmt.where(seek_condition(ordering, values))
+        rows = (await session.scalars(stmt.limit(page_size))).all()
+        if len(rows) < page_size:
+            return rows, None
+        return rows, encode_cursor([getattr(rows[-1], column.key) for column, _ in columns])
+
+    @classmethod
+    async def iter_pages(
+        cls: T, session: ASession, *filters, order_by: list = None, page_size: int = 100
+    ) -> AsyncIterator[list[T]]:
+        """Walks through all matching rows page by page. See `paginate`.
+        Raises `RuntimeError` if page doesn't advance cursor (which would otherwise repeat it forever)"""
+        cursor = None
+        while True:
+            rows, next_cursor = await cls.paginate(
+                session, *filters, order_by=order_by, page_size=page_size, after=cursor
+            )
+            if next_cursor is not None and next_cursor == cursor:
+                raise RuntimeError(f"Pagination of {cls.__name__} made no progress past cursor {cursor!r}")
+            if rows:
+                yield rows
+            if next_cursor is None:
+                return
+            cursor = next_cursor
+
+    @classmethod
+    def _keyset(cls: T, order_by: list = None) -> list[tuple[sa.ColumnElement, bool]]:
+        """Ordering columns along with whether they are descending, ending with primary key"""
+        columns = []
+        for column in order_by or []:
+            descending = False
+            if isinstance(column, str):
+                descending = column.startswith("-")
+                column = getattr(cls, column.lstrip("-"))
+            elif isinstance(column, sa.UnaryExpression):
+                descending = column.modifier is sa.sql.operators.desc_op
+                column = column.element
+            columns.append((column, descending))
+        keys = {column.key for column, _ in columns}
+        columns.extend((getattr(cls, pk.key), False) for pk in cls.__mapper__.primary_key if pk.key not in keys)
+        return columns
+
+    @classmethod
+    async def fetch_or_add_multiple(
+        cls: T, session: ASession, *ids: int, bulk: bool = False, chunk_size: int = BIND_PARAMS_LIMIT
+    ) -> list[T]:
+        """Fetch or create objects for each provided ID, preserving order of `ids`
+
+        :param bulk: Fetch with `WHERE id IN (...)` (in chunks of `chunk_size`) and insert missing rows in a single
+            batched `INSERT` (`ON CONFLICT DO NOTHING` where supported) instead of querying each ID separately.
+            Created rows are inserted immediately rather than added to session as pending objects
+        """
+        if bulk:
+            return await cls._fetch_or_add_bulk(session, ids, chunk_size)
         objects = []
         for id in ids:
             objects.append(await cls.fetch_or_add(session, id=id))
@@ -59,24 +577,114 @@ class Base(orm.MappedAsDataclass, AsyncAttrs, orm.DeclarativeBase):
             session.add(obj)
         return objects
 
+    @classmethod
+    async def _fetch_in(cls: T, session: ASession, ids: list[int], chunk_size: int) -> dict[int, T]:
+        """Fetches rows by IDs in chunks, returns mapping of ID to row"""
+        if (stmt := STATEMENTS.get((cls, "id_in"))) is None:
+            stmt = cls.register_statement("id_in", select(cls).where(cls.id.in_(sa.bindparam("ids", expanding=True))))
+        rows = {}
+        for chunk in chunks(ids, chunk_size):
+            for row in await session.scalars(stmt, {"ids": chunk}):
+                rows[row.id] = row
+        return rows
+
+    @classmethod
+    async def _fetch_or_add_bulk(cls: T, session: ASession, ids: tuple[int], chunk_size: int) -> list[T]:
+        unique = list(dict.fromkeys(ids))
+        rows = await cls._fetch_in(session, unique, chunk_size)
+
+        if missing := [id for id in unique if id not in rows]:
+            stmt = dialect_insert(session.bind.dialect.name, cls)
+            if hasattr(stmt, "on_conflict_do_nothing"):
+                stmt = stmt.on_conflict_do_nothing(index_elements=["id"])
+            for chunk in chunks(missing, chunk_size):
+                await session.execute(stmt, [{"id": id} for id in chunk])
+            rows.update(await cls._fetch_in(session, missing, chunk_size))
+
+        return [rows[id] for id in ids]
+
     @classmethod
     async def by_id(cls: T, session: ASession, id: int) -> T | None:
-        return await session.scalar(select(cls).filter_by(id=id))
+        return await cls._fetch(session, cls.statement("id"), ("id", id), {"id": id})
 
     @classmethod
     async def by_name(cls: T, session: ASession, name: str) -> T | None:
-        return await session.scalar(select(cls).filter_by(name=name))
+        return await cls._fetch(session, cls.statement("name"), ("name", name), {"name": name})
 
     @classmethod
     async def get(cls: T, session: ASession, *args) -> T | None:
-        return await session.scalar(select(cls).filter(*args))
+        return await cls._fetch(session, select(cls).filter(*args))
+
+    @classmethod
+    async def _fetch(cls: T, session: ASession, stmt: Select, key: Hashable = None, params: dict = None) -> T | None:
+        """Fetches single row, reading through model's cache if it's enabled
+        and sharing query with concurrent callers fetching same row"""
+        if (key := key or statement_key(stmt)) is not None:
+            key = hashable(cls, key)
+        cache = CACHES.get(cls) if key else None
+        # Cached rows don't reflect changes made (or flushed) within session's transaction
+        if cache is not None and (cls in session.info.get(CHANGED_MODELS, ()) or not session.sync_session._is_clean()):
+            cache = None
+
+        if cache is not None and (cached := cache.get(key)) is not None:
+            return await attach(session, cached)
+
+        generation = cache.generation if cache is not None else None
+        row = await coalesce(session, key, lambda: session.scalar(stmt, params))
+        if (
+            cache is not None
+            and row is not None
+            and cache.generation == generation
+            and cls not in session.info.get(CHANGED_MODELS, ())
+        ):
+            cache.set(key, snapshot(row))
+        return row
+
+    @classmethod
+    def statement(cls: T, *columns: str) -> Select[T]:
+        """Returns `SELECT` of model filtered by equality of each column attribute (not relationship)
+        to bound parameter of the same name.
+        Statement is built once per model and set of columns, so it's cache key doesn't have to be regenerated
+
+        >>> await session.scalars(Model.statement("id", "name"), {"id": 1, "name": "Name"})
+        """
+        if (stmt := STATEMENTS.get((cls, columns))) is None:
+            stmt = STATEMENTS[(cls, columns)] = select(cls).where(
+                *(getattr(cls, column) == sa.bindparam(column) for column in columns)
+            )
+        return stmt
+
+    @classmethod
+    def register_statement(cls: T, name: str, statement: Select) -> Select:
+        """Registers prebuilt (parametrized with `bindparam`) statement to be reused with `prepared`"""
+        STATEMENTS[(cls, name)] = statement
+        return statement
 
+    @classmethod
+    def prepared(cls: T, name: str) -> Select:
+        """Returns statement registered with `register_statement`"""
+        return STATEMENTS[(cls, name)]
 
-    def __init_subclass__(cls, schema: str = None, **kwargs):
+    @classmethod
+    def _filter_by(cls: T, kwargs: dict, *args) -> tuple[Select[T], dict | None]:
+        """Statement with parameters for `filter_by` equivalent, using cached statement when possible"""
+        columns = cls.__mapper__.column_attrs
+        if args or any(value is None or key not in columns for key, value in kwargs.items()):
+            return select(cls).filter(*args).filter_by(**kwargs), None
+        return cls.statement(*sorted(kwargs)), kwargs
+
+    def __init_subclass__(cls, schema: str = None, cache: bool | int = None, cache_ttl: float = None, **kwargs):
+        """
+        :param schema: Schema (MetaData) to which model belongs
+        :param cache: Enables read-through cache of `by_id`, `by_name` and `get`. Integer sets max amount of rows
+        :param cache_ttl: Seconds after which cached row expires
+        """
         if schema:
             if schema not in SCHEMAS:
                 SCHEMAS[schema] = sa.MetaData(schema)
             cls.metadata = SCHEMAS[schema]
+        if cache or cache_ttl:
+            CACHES[cls] = ModelCache(cache if type(cache) is int else DEFAULT_CACHE_SIZE, cache_ttl)
         return super().__init_subclass__(**kwargs)
 
 
@@ -108,7 +716,7 @@ class ImperativeTable:
                         primary_key=value.column.primary_key,
                     )
                 )
-                cls.__delattr__(cls, attribute)
+                delattr(cls, attribute)
             else:
                 columns.append(sa.Column(attribute, SQL_TYPES.get(annotation), nullable=nullable))
 
@@ -157,37 +765,330 @@ class TimestampUpdate(orm.MappedAsDataclass):
     timestamp: orm.Mapped[ts_update] = orm.mapped_column(kw_only=True, default=None)
 
 
-async def extend_enums(session: async_sessionmaker[ASession], engine: Engine, module):
-    """Extends existing DB Enum with new values from Coded Enum"""
-    s = session()
+ENUM_FINGERPRINTS: set[str] = set()
+"""Fingerprints of enum definitions (and target database) already synchronized by this process"""
+
+
+def enum_members(module) -> dict[str, tuple[str, list[str]]]:
+    """Returns database type names mapped to enum name and it's member names for each Enum in module"""
+    enums = {}
     for _class in vars(module).values():
         if isclass(_class) and issubclass(_class, enum.Enum) and len(_class.__members__) > 0:
-            try:
-                r = await s.execute(
-                    sa.text("SELECT * FROM unnest(enum_range(NULL::{}))".format(_class.__name__.lower()))
-                )
-                r = r.scalars().all()
-            except ProgrammingError as ex:
-                log.warning("Unnesting enum %s failed", _class.__name__)
-                await s.rollback()
-                continue
-            new_members = []
+            members = []
             for member in _class.__members__.keys():
                 if hasattr(_class, "get"):
                     member = _class.get(member)
                     member = member.name
-                if member not in r:
-                    new_members.append(member)
-            if new_members != []:
-                for member in new_members:
-                    log.info("Extending %s with value %s", _class.__name__, member)
-                    await s.execute(sa.text("ALTER TYPE {} ADD VALUE '{}'".format(_class.__name__.lower(), member)))
-                await s.commit()
-    await s.close()
+                members.append(member)
+            enums[_class.__name__.lower()] = (_class.__name__, members)
+    return enums
+
+
+async def extend_enums(
+    session: async_sessionmaker[ASession], engine: Engine, module, fingerprint_file: str = None
+) -> int:
+    """Extends existing DB Enum with new values from Coded Enum.
+    Reads labels of all enums with single catalog query and adds missing ones within one transaction.
+    Does nothing if enum definitions are unchanged since last run in this process
+    or since the fingerprint stored in `fingerprint_file`. Returns amount of added values"""
+    enums = enum_members(module)
+    if not enums:
+        return 0
+
+    # Same definitions still have to be synchronized with every other database
+    database = engine.url.render_as_string(hide_password=True)
+    definitions = sorted((name, members) for name, (_, members) in enums.items())
+    fingerprint = hashlib.sha256(repr((database, definitions)).encode())
+    fingerprint = fingerprint.hexdigest()
+    if fingerprint in ENUM_FINGERPRINTS:
+        return 0
+    if fingerprint_file and os.path.exists(fingerprint_file):
+        with open(fingerprint_file, "r", encoding="utf-8") as file:
+            if file.read().strip() == fingerprint:
+                ENUM_FINGERPRINTS.add(fingerprint)
+                return 0
+
+    s = session()
+    added, complete = 0, True
+    try:
+        result = await s.execute(
+            sa.text(
+                "SELECT t.typname, e.enumlabel FROM pg_type t JOIN pg_enum e ON e.enumtypid = t.oid "
+                "WHERE t.typname IN :names"
+            ).bindparams(sa.bindparam("names", expanding=True)),
+            {"names": list(enums)},
+        )
+        existing = defaultdict(set)
+        for typname, label in result:
+            existing[typname].add(label)
+
+        for typname, (name, members) in enums.items():
+            if typname not in existing:
+                log.warning("Enum %s doesn't exist in database", name)
+                complete = False
+                continue
+            for member in members:
+                if member not in existing[typname]:
+                    log.info("Extending %s with value %s", name, member)
+                    await s.execute(sa.text("ALTER TYPE {} ADD VALUE IF NOT EXISTS '{}'".format(typname, member)))
+                    added += 1
+        await s.commit()
+    finally:
+        await s.close()
+
+    if complete:
+        ENUM_FINGERPRINTS.add(fingerprint)
+        if fingerprint_file:
+            with open(fingerprint_file, "w", encoding="utf-8") as file:
+                file.write(fingerprint)
+    return added
+
+
+class WriteBehind:
+    """Background writer committing queued add/merge/delete operations together in batches.
+    Batch is written once it reaches `max_batch` items or after `max_delay` seconds since it's first item.
+    Queue holds at most `max_queue` operations, submitting more waits until there is space.
+    If batch fails, it's operations are retried in separate transactions, so only failing ones are rejected"""
+
+    def __init__(
+        self,
+        session: async_sessionmaker[ASession],
+        max_batch: int = 100,
+        max_delay: float = 0.05,
+        max_queue: int = 10_000,
+    ):
+        self.session = session
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue[tuple[str, Base, asyncio.Future]] = None
+        self._task: asyncio.Task = None
+
+    async def submit(self, operation: str, mapping: Base) -> asyncio.Future:
+        """Queues operation (`add`, `merge` or `delete`). Returns future resolved once it's committed"""
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, mapping, future))
+        return future
+
+    async def flush(self):
+        """Waits until all queued operations are written"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Writes remaining operations and stops background task"""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        self._task = self._queue = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                if (timeout := deadline - loop.time()) <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[tuple[str, Base, asyncio.Future]]):
+        try:
+            async with self.session.begin() as s:
+                for operation, mapping, _ in batch:
+                    if operation == "add":
+                        s.add(mapping)
+                    else:
+                        await getattr(s, operation)(mapping)
+        except Exception as ex:
+            if len(batch) > 1:
+                log.warning("Writing batch of %s operations failed, retrying separately", len(batch))
+                for item in batch:
+                    await self._write([item])
+                return
+            log.exception("Writing %s of %s failed", batch[0][0], batch[0][1], exc_info=ex)
+            if not (future := batch[0][2]).done():
+                future.set_exception(ex)
+                future.exception()
+            return
+        for *_, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+
+PARAMETER = r"(?:\?|\$\d+(?:::\w+)?|%\(\w+\)s|%s|:\w+)"
+PARAMETER_LIST = re.compile(r"\(\s*{0}(?:\s*,\s*{0})+\s*\)".format(PARAMETER))
+LITERAL = re.compile(r"'(?:[^']|'')*'|(?<!\$)\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(statement: str) -> str:
+    """Replaces literals with placeholders and collapses expanded parameter lists, so similar statements match"""
+    statement = WHITESPACE.sub(" ", statement).strip()
+    statement = PARAMETER_LIST.sub("(?)", statement)
+    return LITERAL.sub("?", statement)
+
+
+class CountingCursor:
+    """DB-API cursor proxy reporting amount of rows fetched from it"""
+
+    def __init__(self, cursor, count: Callable[[int], None]):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_count", count)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._cursor, name, value)
+
+    def fetchone(self):
+        if (row := self._cursor.fetchone()) is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class QueryStats:
+    """Collects statement latency and rows (fetched for SELECTs, affected as reported by driver otherwise)
+    per normalized statement, pool checkout wait and transaction durations from engine events.
+    Statements taking longer than `slow_query` seconds are logged on BENCHMARK level"""
+
+    def __init__(self, slow_query: float = None):
+        self.slow_query = slow_query
+        self.reset()
+
+    def reset(self):
+        self.statements: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.rows: defaultdict[str, int] = defaultdict(int)
+        self.checkout = Histogram()
+        self.transactions = Histogram()
+
+    def snapshot(self) -> dict[str, dict]:
+        """Current statistics in plain dictionaries"""
+        return {
+            "statements": {
+                sql: {**histogram.snapshot(), "rows": self.rows[sql]} for sql, histogram in self.statements.items()
+            },
+            "checkout": self.checkout.snapshot(),
+            "transactions": self.transactions.snapshot(),
+        }
+
+    def _listeners(self) -> list[tuple[str, Callable]]:
+        return [
+            ("before_cursor_execute", self._before_execute),
+            ("after_cursor_execute", self._after_execute),
+            ("handle_error", self._handle_error),
+            ("begin", self._begin),
+            ("commit", self._end),
+            ("rollback", self._end),
+        ]
+
+    def attach(self, engine: Engine):
+        """Starts listening to events of (synchronous) engine and timing it's pool checkouts"""
+        for event, listener in self._listeners():
+            sa.event.listen(engine, event, listener)
+
+        pool, do_get = engine.pool, engine.pool._do_get
+
+        def timed_do_get():
+            start = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                self.checkout.add(time.perf_counter() - start)
+
+        pool._do_get = timed_do_get
+
+    def detach(self, engine: Engine):
+        for event, listener in self._listeners():
+            sa.event.remove(engine, event, listener)
+        engine.pool.__dict__.pop("_do_get", None)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("mlib_query_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["mlib_query_start"].pop()
+        sql = normalize_sql(statement)
+        self.statements[sql].add(elapsed)
+        if cursor.description is not None and context is not None:
+            # Rows of SELECT are counted as they are fetched, since drivers report rowcount -1 for them
+            rows = self.rows
+
+            def count(amount: int):
+                rows[sql] += amount
+
+            context.cursor = CountingCursor(cursor, count)
+        elif cursor.rowcount > 0:
+            self.rows[sql] += cursor.rowcount
+        if self.slow_query is not None and elapsed >= self.slow_query:
+            log.log(BENCHMARK, "Slow query took %.3fs: %s", elapsed, statement)
+
+    def _handle_error(self, exception_context: sa.engine.ExceptionContext):
+        """Drops start time of statement that failed before `after_cursor_execute`"""
+        conn = exception_context.connection
+        if (
+            conn is not None
+            and exception_context.statement is not None
+            and (starts := conn.info.get("mlib_query_start"))
+        ):
+            starts.pop()
+
+    def _begin(self, conn):
+        conn.info["mlib_transaction_start"] = time.perf_counter()
+
+    def _end(self, conn):
+        if (start := conn.info.pop("mlib_transaction_start", None)) is not None:
+            self.transactions.add(time.perf_counter() - start)
+
+
+def pool_status(engine: Engine) -> dict[str, int]:
+    """Returns connection counts of engine's pool (if it's pool keeps them)"""
+    pool = engine.pool
+    return {
+        stat: getattr(pool, method)()
+        for stat, method in [
+            ("size", "size"),
+            ("checked_in", "checkedin"),
+            ("checked_out", "checkedout"),
+            ("overflow", "overflow"),
+        ]
+        if hasattr(pool, method)
+    }
 
 
 class SQL:
-    """Synchronous SQLAlchemy client. Creates engine and sessionmaker"""
+    """Synchronous SQLAlchemy client. Creates engine and sessionmaker.
+    Reads can be spread across `replicas` (list of connection URLs), see `Session`"""
+
+    stats: QueryStats = None
+    _replicas: list[Engine] = []
 
     def __init__(
         self,
@@ -197,14 +1098,29 @@ class SQL:
         location: str = None,
         port: int = 5432,
         name: str = "db",
-        echo: bool = True,
+        echo: bool = False,
         *,
         url: str = None,
+        replicas: list[str] = None,
+        pool_size: int = None,
+        max_overflow: int = None,
+        pool_pre_ping: bool = None,
+        pool_recycle: int = None,
         **kwargs,
     ):
+        for option, value in [
+            ("pool_size", pool_size),
+            ("max_overflow", max_overflow),
+            ("pool_pre_ping", pool_pre_ping),
+            ("pool_recycle", pool_recycle),
+        ]:
+            if value is not None:
+                kwargs[option] = value
         try:
             url = url or self.build_url(name, db, user, password, location, port)
             self._create_engine(url, echo=echo, **kwargs)
+            if replicas:
+                self._replicas = [self._new_engine(replica, echo=echo, **kwargs) for replica in replicas]
         except ConnectionError as ex:
             log.exception("Connecting to Remote DB failed! Falling back to local SQLite", exc_info=ex)
             self._create_engine(self.build_url + ".db", echo=echo)
@@ -225,13 +1141,35 @@ class SQL:
             url += f":{port}"
         return f"{db}://{url}/{name}"
 
-    def _create_engine(self, url: str, echo: bool = True, **kwargs):
+    def _new_engine(self, url: str, echo: bool = False, **kwargs) -> Engine:
+        return sa.create_engine(url, echo=echo, **kwargs)
+
+    def _create_engine(self, url: str, echo: bool = False, **kwargs):
         """Creates synchronous engine"""
-        self._engine = sa.create_engine(url, echo=echo, **kwargs)
+        self._engine = self._new_engine(url, echo=echo, **kwargs)
+
+    def _sync_engines(self) -> list[Engine]:
+        return [getattr(engine, "sync_engine", engine) for engine in [self._engine, *self._replicas]]
 
     def _create_sessionmaker(self):
         """Creates synchronous session factory"""
-        self._session = orm.sessionmaker(bind=self._engine)
+        self._session = orm.sessionmaker(bind=self._engine, class_=Session, replicas=self._sync_engines()[1:])
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """Connection counts of primary's and replicas' pools"""
+        primary, *replicas = self._sync_engines()
+        return {"primary": pool_status(primary)} | {
+            f"replica_{i}": pool_status(replica) for i, replica in enumerate(replicas)
+        }
+
+    def instrument(self, slow_query: float = None) -> QueryStats:
+        """Starts collecting query statistics. See `QueryStats`"""
+        if self.stats is None:
+            self.stats = QueryStats(slow_query)
+            for engine in self._sync_engines():
+                self.stats.attach(engine)
+        self.stats.slow_query = slow_query
+        return self.stats
 
     def Session(self):
         """Creates new session"""
@@ -266,20 +1204,51 @@ class SQL:
             return self.merge(mapping)
         return self.add(mapping)
 
-    def extend_enums(self, module):
-        return extend_enums(self.session(), self._engine, module)
+    def upsert_many(
+        self,
+        model: Type[Base],
+        rows: Iterable[dict],
+        conflict_keys: list[str] = None,
+        update_columns: list[str] = None,
+        batch_size: int = 1000,
+    ) -> int | None:
+        """Inserts or updates rows in batches using `INSERT ... ON CONFLICT` within single transaction.
+        Returns amount of affected rows as reported by driver or None if driver doesn't report it for executemany
+        (like psycopg2 and asyncpg)
+
+        :param conflict_keys: Columns of unique constraint to detect conflicts on. Defaults to primary key
+        :param update_columns: Columns to update on conflict. Defaults to other columns of first row.
+            Empty list skips conflicting rows instead
+        """
+        affected = 0
+        with self._engine.begin() as conn:
+            for stmt, batch in upsert_batches(
+                conn.dialect.name, model, rows, conflict_keys, update_columns, batch_size
+            ):
+                affected += conn.execute(stmt, batch).rowcount
+            counted = conn.dialect.supports_sane_multi_rowcount
+        evict(model)
+        return affected if counted else None
+
+    def extend_enums(self, module, fingerprint_file: str = None):
+        return extend_enums(self.session(), self._engine, module, fingerprint_file)
 
 
 class AsyncSQL(SQL):
     """Asynchronous SQLAlchemy client. Creates async engine and async sessionmaker"""
 
-    def _create_engine(self, url: str, echo: bool = True, **kwargs):
+    _writer: WriteBehind = None
+
+    def _new_engine(self, url: str, echo: bool = False, **kwargs):
+        return create_async_engine(url, echo=echo, **kwargs)
+
+    def _create_engine(self, url: str, echo: bool = False, **kwargs):
         """Creates asynchronous engine"""
-        self._engine = create_async_engine(url, echo=echo, **kwargs)
+        self._engine = self._new_engine(url, echo=echo, **kwargs)
 
     def _create_sessionmaker(self):
         """Creates asynchronous session factory"""
-        self.session = async_sessionmaker(bind=self._engine, class_=ASession)
+        self.session = async_sessionmaker(bind=self._engine, class_=ASession, replicas=self._sync_engines()[1:])
 
     async def create_tables(self, base: Base = Base):
         """Creates tables asynchronously. To be used with await"""
@@ -291,22 +1260,61 @@ class AsyncSQL(SQL):
         async with self._engine.begin() as conn:
             await conn.run_sync(base.metadata.drop_all)
 
-    async def merge(self, mapping: T):
+    def write_behind(self, max_batch: int = 100, max_delay: float = 0.05, max_queue: int = 10_000) -> WriteBehind:
+        """Makes `add`, `merge` and `delete` queue operations to be committed in batches by background task.
+        These then return future resolved once operation is committed instead of waiting for it. See `WriteBehind`"""
+        self._writer = WriteBehind(self.session, max_batch, max_delay, max_queue)
+        return self._writer
+
+    async def close(self):
+        """Writes queued operations and disposes engine"""
+        if self._writer:
+            await self._writer.close()
+        for engine in [self._engine, *self._replicas]:
+            await engine.dispose()
+
+    async def merge(self, mapping: T) -> asyncio.Future | None:
+        if self._writer:
+            return await self._writer.submit("merge", mapping)
         async with self.session.begin() as s:
-            s.merge(mapping)
+            await s.merge(mapping)
 
-    async def add(self, mapping: T):
+    async def add(self, mapping: T) -> asyncio.Future | None:
+        if self._writer:
+            return await self._writer.submit("add", mapping)
         async with self.session.begin() as s:
             s.add(mapping)
 
-    async def delete(self, mapping: T):
+    async def delete(self, mapping: T) -> asyncio.Future | None:
+        if self._writer:
+            return await self._writer.submit("delete", mapping)
         async with self.session.begin() as s:
-            s.delete(mapping)
+            await s.delete(mapping)
 
     async def merge_or_add(self, queried_result: T | None, mapping: T):
         if queried_result:
             return await self.merge(mapping)
         return await self.add(mapping)
 
-    async def extend_enums(self, session: ASession, module):
-        return await extend_enums(session, self._engine, module)
+    async def upsert_many(
+        self,
+        model: Type[Base],
+        rows: Iterable[dict],
+        conflict_keys: list[str] = None,
+        update_columns: list[str] = None,
+        batch_size: int = 1000,
+    ) -> int | None:
+        """Inserts or updates rows in batches using `INSERT ... ON CONFLICT` within single transaction.
+        Returns amount of affected rows as reported by driver (if it does). See `SQL.upsert_many`"""
+        affected = 0
+        async with self._engine.begin() as conn:
+            for stmt, batch in upsert_batches(
+                conn.dialect.name, model, rows, conflict_keys, update_columns, batch_size
+            ):
+                affected += (await conn.execute(stmt, batch)).rowcount
+            counted = conn.dialect.supports_sane_multi_rowcount
+        evict(model)
+        return affected if counted else None
+
+    async def extend_enums(self, session: ASession, module, fingerprint_file: str = None):
+        return await extend_enums(session, self._engine, module, fingerprint_file)
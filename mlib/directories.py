@@ -0,0 +1,139 @@
+"""
+Directories
+---
+Recursive index of files (name, size and modification time) built with `os.scandir` in parallel threads.
+Refreshing rescans only directories whose modification time changed, so unchanged subtrees cost one `stat` each.
+
+index = DirectoryIndex("assets")
+
+index.refresh()
+
+index.files("sprites/*", extensions=[".png"])
+
+index.save("assets.index")
+"""
+
+import fnmatch, os, pickle, re, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator
+
+RACY_NS = 2_000_000_000
+"""Directories modified this recently (in nanoseconds) before scan are rescanned on next refresh,
+as further changes within timestamp resolution wouldn't change their modification time"""
+
+
+class Entry:
+    __slots__ = ("path", "name", "size", "mtime")
+
+    def __init__(self, path: str, name: str, size: int, mtime: float):
+        self.path = path
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+
+    def __repr__(self) -> str:
+        return f"Entry({self.path!r}, size={self.size}, mtime={self.mtime})"
+
+
+class Directory:
+    """Listing of single directory: files as name -> (size, mtime) and names of subdirectories"""
+
+    __slots__ = ("mtime", "files", "directories")
+
+    def __init__(self, mtime: int | None, files: dict[str, tuple[int, float]], directories: list[str]):
+        self.mtime = mtime
+        self.files = files
+        self.directories = directories
+
+
+def _pattern(pattern: str | None):
+    return re.compile(fnmatch.translate(pattern)).match if pattern else None
+
+
+class DirectoryIndex:
+    """Files under `root` keyed by directory path relative to it (`/` separated, root itself is `""`).
+    Symlinks to directories aren't followed. Modifying file's content doesn't change it's directory,
+    so sizes and modification times are only updated when directory itself changes or on `refresh(full=True)`"""
+
+    def __init__(self, root: str, threads: int = None):
+        self.root = root
+        self.threads = threads
+        self.directories: dict[str, Directory] = {}
+
+    def __len__(self) -> int:
+        return sum(len(directory.files) for directory in self.directories.values())
+
+    def _visit(self, path: str, full: bool) -> Directory | None:
+        location = os.path.join(self.root, path)
+        try:
+            mtime = os.stat(location).st_mtime_ns
+            cached = self.directories.get(path)
+            if not full and cached is not None and cached.mtime == mtime:
+                return cached
+            files, directories = {}, []
+            with os.scandir(location) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+        if time.time_ns() - mtime < RACY_NS:
+            mtime = None
+        return Directory(mtime, files, directories)
+
+    def refresh(self, full: bool = False) -> "DirectoryIndex":
+        """Walks tree in parallel threads, rescanning only changed directories (or all of them if `full`)"""
+        directories: dict[str, Directory] = {}
+        with ThreadPoolExecutor(self.threads) as executor:
+            pending = {executor.submit(self._visit, "", full): ""}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    if (directory := future.result()) is None:
+                        continue
+                    directories[path] = directory
+                    for name in directory.directories:
+                        subdirectory = f"{path}/{name}" if path else name
+                        pending[executor.submit(self._visit, subdirectory, full)] = subdirectory
+        self.directories = directories
+        return self
+
+    def files(self, pattern: str = None, extensions: Iterable[str] = None) -> Iterator[Entry]:
+        """Files with relative path matching glob `pattern` (`*` matches across directories too)
+        and with one of `extensions` (like `.png`, case insensitive)"""
+        match = _pattern(pattern)
+        if extensions is not None:
+            extensions = tuple(
+                extension.lower() if extension.startswith(".") else f".{extension.lower()}" for extension in extensions
+            )
+        for path, directory in self.directories.items():
+            for name, (size, mtime) in directory.files.items():
+                if extensions is not None and not name.lower().endswith(extensions):
+                    continue
+                file = f"{path}/{name}" if path else name
+                if match is None or match(file):
+                    yield Entry(file, name, size, mtime)
+
+    def subdirectories(self, pattern: str = None) -> Iterator[str]:
+        """Relative paths of indexed directories (except root) matching glob `pattern`"""
+        match = _pattern(pattern)
+        for path in self.directories:
+            if path and (match is None or match(path)):
+                yield path
+
+    def save(self, filename: str):
+        with open(filename, "wb") as file:
+            pickle.dump((self.root, self.directories), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename: str, threads: int = None) -> "DirectoryIndex":
+        """Index saved with `save`, call `refresh` to bring it up to date"""
+        with open(filename, "rb") as file:
+            root, directories = pickle.load(file)
+        index = cls(root, threads)
+        index.directories = directories
+        return index
@@ -1,29 +1,204 @@
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, Sequence
 
 
-def read_file(filename: str, filter_func: callable = lambda i: i) -> list:
+def iter_file(filename: str, filter_func: callable = lambda i: i) -> Iterator:
+    """Lazily yields stripped lines of file passed through filter_func"""
     with open(filename, "r", newline="", encoding="utf-8") as file:
-        lines = file.readlines()
-    array = []
-    for line in lines:
-        array.append(filter_func(line.strip()))
-    return array
+        for line in file:
+            yield filter_func(line.strip())
+
+
+def read_file(filename: str, filter_func: callable = lambda i: i) -> list:
+    return list(iter_file(filename, filter_func))
 
 
-def write_file(filename: str, lines: list) -> None:
+def write_file(filename: str, lines: Iterable[str], batch_size: int = 1024) -> None:
+    """Writes lines (any iterable, consumed lazily) joining them in batches to limit write calls"""
+    from .chunking import chunked
+
     with open(filename, "w", encoding="utf-8") as file:
-        file.writelines(lines)
+        for batch in chunked(lines, batch_size):
+            file.write("".join(batch))
+
+
+class MappedFile:
+    """Memory-mapped file read line by line from any byte offset.
+    Lines are bytes including line ending, only pages being read are kept in memory by OS"""
+
+    def __init__(self, filename: str):
+        import mmap
+
+        self.filename = filename
+        self._file = open(filename, "rb")
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            self.map = b""
+        self.size = len(self.map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not isinstance(self.map, bytes):
+            self.map.close()
+        self._file.close()
+
+    def line_start(self, offset: int) -> int:
+        """Offset of first line starting at or after offset"""
+        if offset <= 0:
+            return 0
+        newline = self.map.find(b"\n", offset - 1)
+        return self.size if newline == -1 else newline + 1
+
+    def lines(self, start: int = 0, end: int = None) -> Iterator[tuple[int, bytes]]:
+        """Yields offsets and lines starting in range from `start` (which has to be start of line) to `end`"""
+        end = self.size if end is None else min(end, self.size)
+        find, position = self.map.find, start
+        while position < end:
+            newline = find(b"\n", position)
+            next_position = self.size if newline == -1 else newline + 1
+            yield position, self.map[position:next_position]
+            position = next_position
+
+    def ranges(self, parts: int) -> list[tuple[int, int]]:
+        """Splits file into up to `parts` ranges of similar size aligned to line boundaries"""
+        boundaries = sorted({self.line_start(self.size * i // parts) for i in range(parts)} | {self.size})
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def _process_range(filename: str, start: int, end: int, func: Callable[[Iterator[str]], Any], encoding: str) -> Any:
+    with MappedFile(filename) as file:
+        return func(line.decode(encoding).strip() for _, line in file.lines(start, end))
+
+
+def process_lines(
+    filename: str,
+    func: Callable[[Iterator[str]], Any],
+    processes: int = None,
+    parts: int = None,
+    encoding: str = "utf-8",
+) -> list:
+    """Splits file into line-aligned ranges and calls `func` with iterator of stripped lines of each range
+    in a pool of worker processes. Returns results of each range in order.
+    `func` has to be picklable (module level function) and should aggregate lines to keep memory use constant"""
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    processes = processes or os.cpu_count() or 1
+    with MappedFile(filename) as file:
+        ranges = file.ranges(parts or processes * 4)
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_process_range, filename, start, end, func, encoding) for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def _converters(columns: list, types: Sequence[Callable] | dict[str | int, Callable] | None) -> list:
+    """Converter per column position from sequence of converters or mapping of column names (or indexes)"""
+    if types is None:
+        return [None] * len(columns)
+    if not isinstance(types, dict):
+        return list(types) + [None] * (len(columns) - len(types))
+    return [types.get(name, types.get(i)) for i, name in enumerate(columns)]
+
+
+def _column_converters(names: list, types: Sequence[Callable] | dict[str | int, Callable] | None) -> list:
+    """Pairs of column position and converter, independent of amount of values in any data row"""
+    if types is None:
+        return []
+    if not isinstance(types, dict):
+        return [(i, convert) for i, convert in enumerate(types) if convert is not None]
+    converters = {key: convert for key, convert in types.items() if isinstance(key, int)}
+    # Names take precedence over indexes of the same column
+    positions = {name: i for i, name in enumerate(names)}
+    converters.update((positions[key], convert) for key, convert in types.items() if key in positions)
+    return [(i, convert) for i, convert in converters.items() if convert is not None]
+
+
+def iter_csv(
+    filename: str,
+    types: Sequence[Callable] | dict[str | int, Callable] = None,
+    header: bool = False,
+    encoding: str = "utf-8",
+    **fmtparams,
+) -> Iterator[list | dict]:
+    """Lazily yields rows of CSV file, as dicts keyed by names from first row if `header`.
+    `types` converts values of columns (by position or name), empty values of converted columns become None.
+    Blank lines are skipped"""
+    import csv
+
+    with open(filename, "r", newline="", encoding=encoding) as file:
+        reader = csv.reader(file, **fmtparams)
+        names = next(reader, []) if header else None
+        converters = _column_converters(names or [], types)
+        for row in filter(None, reader):
+            for i, convert in converters:
+                if i < len(row):
+                    row[i] = convert(row[i]) if row[i] != "" else None
+            yield dict(zip(names, row)) if header else row
+
+
+def iter_csv_chunks(filename: str, chunk_size: int = 10_000, **kwargs) -> Iterator[list[list | dict]]:
+    """Batches of up to chunk_size rows, see `iter_csv`"""
+    from .chunking import chunked
+
+    return chunked(iter_csv(filename, **kwargs), chunk_size)
 
 
 def load_csv(filename) -> list:
+    return list(iter_csv(filename))
+
+
+def iter_csv_columns(
+    filename: str,
+    chunk_size: int = 100_000,
+    types: dict[str | int, Any] = None,
+    frames: bool = False,
+    encoding: str = "utf-8",
+    **fmtparams,
+):
+    """Yields chunks of CSV file (with header) as dicts of NumPy arrays per column or, if `frames`, pandas DataFrames.
+    `types` are NumPy dtypes (or Python types) of columns, other columns are kept as strings (pandas infers them).
+    Blank lines are skipped, rows with different amount of values than header raise `ValueError`"""
+    if frames:
+        import pandas as pd
+
+        yield from pd.read_csv(filename, chunksize=chunk_size, dtype=types, encoding=encoding, **fmtparams)
+        return
     import csv
+    import numpy as np
+    from .chunking import chunked
+
+    with open(filename, "r", newline="", encoding=encoding) as file:
+        reader = csv.reader(file, **fmtparams)
+        names = next(reader, [])
+        dtypes = _converters(names, types)
+        width = len(names)
+        for rows in chunked(filter(None, reader), chunk_size):
+            # Transposing with zip would silently truncate every column to the shortest row
+            if ragged := next((row for row in rows if len(row) != width), None):
+                raise ValueError(f"Row {ragged!r} of {filename} has {len(ragged)} values instead of {width}")
+            yield {name: np.array(column, dtype=dtype) for name, dtype, column in zip(names, dtypes, zip(*rows))}
 
-    rows = []
-    with open(filename, "r", newline="", encoding="utf-8") as file:
-        for row in csv.reader(file):
-            rows.append(row)
-            # yield row
-    return rows
+
+def load_csv_columns(filename: str, types: dict[str | int, Any] = None, frames: bool = False, **kwargs):
+    """Whole CSV file (with header) as dict of NumPy arrays per column or pandas DataFrame (if `frames`)
+    built from chunks, without list of rows"""
+    if frames:
+        import pandas as pd
+
+        return pd.read_csv(filename, dtype=types, **kwargs)
+    import numpy as np
+
+    columns: dict[str, list] = {}
+    for chunk in iter_csv_columns(filename, types=types, **kwargs):
+        for name, array in chunk.items():
+            columns.setdefault(name, []).append(array)
+    return {name: np.concatenate(arrays) for name, arrays in columns.items()}
 
 
 def check_if_exists(_dir):
@@ -37,40 +212,146 @@ def check_if_exists(_dir):
     return False
 
 
+INDEXES = {}
+"""`DirectoryIndex` per path listed by `listFiles`, refreshed incrementally on each call"""
+
+
 def listFiles(path, include_directory=False):
-    import glob
+    """Files under path (hidden ones are skipped like by glob) as paths relative to it or names without extension"""
+    import os
+    from .directories import DirectoryIndex
 
-    files = glob.glob(f"{path}/**/*", recursive=True)
+    if (index := INDEXES.get(path)) is None:
+        index = INDEXES[path] = DirectoryIndex(path)
+    files = [entry for entry in index.refresh().files() if "/." not in "/" + entry.path]
     if include_directory:
-        return [i.replace(path, "") for i in files]
-    else:
-        return [i.replace("\\", "/").split("/")[-1].split(".")[0] for i in files]
+        # Relative to `path` with it's trailing separator, or starting with `/` when it has none (as glob did)
+        prefix = "" if path.endswith(("/", os.sep)) else "/"
+        return [prefix + entry.path.replace("/", os.sep) for entry in files]
+    return [entry.name.split(".")[0] for entry in files]
+
+
+DATA_DIRECTORY = "data"
+LOADED: dict[str, tuple[tuple[int, int], Any]] = {}
+"""Parsed files by path along with modification time and size they were parsed at"""
 
 
-def loader(file: str) -> Any | dict[str, Any] | list[Any]:
-    import logging, pathlib
+def _parse(path: str, ext: str) -> Any:
+    match ext:
+        case ".json":
+            try:
+                import orjson
 
-    ext = pathlib.Path(file).suffix
-    with open(f"data/{file}", "rb", encoding="utf-8") as _file:
-        match ext:
-            case "json":
+                with open(path, "rb") as file:
+                    return orjson.loads(file.read())
+            except ImportError:
                 import json
 
-                return json.load(file)
-            case "yaml" | "yml":
-                try:
-                    import yaml
+                with open(path, "r", encoding="utf-8") as file:
+                    return json.load(file)
+        case ".yaml" | ".yml":
+            try:
+                import yaml
+            except ImportError:
+                import logging
+
+                logging.warning("Attempting to load %s file without yaml package", path)
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                return yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        case ".csv":
+            return load_csv(path)
+        case ".toml":
+            import tomllib
+
+            with open(path, "rb") as file:
+                return tomllib.load(file)
+        case _:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+
+
+def loader(file: str, stream: bool = False) -> Any | dict[str, Any] | list[Any]:
+    """Parsed JSON, YAML, TOML, CSV (list of rows) or text file from `DATA_DIRECTORY`.
+    Results are cached until file's modification time or size changes, so they are shared and shouldn't be modified.
+    With `stream` items of JSON array are yielded lazily instead (without caching)"""
+    import os
+
+    path = os.path.join(DATA_DIRECTORY, file)
+    ext = os.path.splitext(file)[1].lower()
+    if stream:
+        return iter_json_array(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if (cached := LOADED.get(path)) is not None and cached[0] == version:
+        return cached[1]
+    data = _parse(path, ext)
+    LOADED[path] = (version, data)
+    return data
+
 
-                    return yaml.safe_load(file)
-                except ImportError:
-                    logging.warning("Attempting to load %s file without yaml package", file)
-            case "csv":
-                import csv
+def preload(files: Iterable[str], threads: int = None) -> dict[str, Any]:
+    """Loads files into `loader`'s cache in parallel threads"""
+    from concurrent.futures import ThreadPoolExecutor
 
-                return csv.reader(_file.readlines())
-            case "toml":
-                import tomllib
+    files = list(files)
+    with ThreadPoolExecutor(threads) as executor:
+        return dict(zip(files, executor.map(loader, files)))
 
-                return tomllib.load(_file)
-            case _:
-                return str(_file.read())
+
+def clear_cache():
+    LOADED.clear()
+
+
+def iter_json_array(filename: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Lazily yields items of top-level JSON array, reading file in chunks of `chunk_size` characters"""
+    import json
+
+    decoder = json.JSONDecoder()
+    skip = json.decoder.WHITESPACE.match
+    with open(filename, "r", encoding="utf-8") as file:
+        buffer, position, eof = "", 0, False
+        expected = "["
+
+        def fill() -> bool:
+            """Reads next chunk into buffer, dropping consumed part. Returns False at end of file"""
+            nonlocal buffer, position, eof
+            if not (chunk := file.read(chunk_size)):
+                eof = True
+                return False
+            buffer, position = buffer[position:] + chunk, 0
+            return True
+
+        while True:
+            position = skip(buffer, position).end()
+            if position == len(buffer):
+                if fill():
+                    continue
+                raise ValueError(f"Unexpected end of JSON array in {filename}")
+            char = buffer[position]
+            if expected == "[":
+                if char != "[":
+                    raise ValueError(f"Expected JSON array in {filename}")
+                position += 1
+                expected = "value"
+            elif expected == "separator" or (expected == "value" and char == "]"):
+                if char == "]":
+                    return
+                if char != "," or expected != "separator":
+                    raise ValueError(f"Expected ',' or ']' at {char!r} in {filename}")
+                position += 1
+                expected = "item"
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if fill():
+                        continue
+                    raise
+                # Value cut by end of buffer (like number) could parse partially, so separator has to be read too
+                following = skip(buffer, end).end()
+                if (following == len(buffer) or buffer[following] not in ",]") and not eof and fill():
+                    continue
+                position = end
+                expected = "separator"
+                yield item
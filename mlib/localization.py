@@ -1,79 +1,231 @@
-import i18n
-def tr(key, language='en', **kwargs):
-    return i18n.t(f'{language}.{key}', **kwargs)
+"""
+Localization
+---
+Translations are looked up through `i18n` loaders (catalog files are loaded lazily, once per namespace/language)
+and cached per `(key, language)` with their templates already parsed, so rendering is a single join.
+Call `clear_cache` after changing `i18n` configuration or adding translations.
+"""
+
+from functools import lru_cache
+from typing import Iterable
+
+from i18n import config, resource_loader, translations
+from i18n.translator import TranslationFormatter
+
+CACHE_SIZE = 4096
+
+
+class Template:
+    """Parsed translation with `%{name}`/`%name` placeholders. Unknown placeholders are left as they are"""
+
+    __slots__ = ("text", "parts")
+
+    def __init__(self, template: str):
+        parts: list[tuple[str, str | None]] = []
+        position = 0
+        for match in TranslationFormatter.pattern.finditer(template):
+            literal = template[position : match.start()]
+            if match.group("escaped") is not None:
+                parts.append((literal + TranslationFormatter.delimiter, None))
+            elif (name := match.group("named") or match.group("braced")) is not None:
+                parts.append((literal, None))
+                parts.append((match.group(), name))
+            else:
+                parts.append((literal + match.group(), None))
+            position = match.end()
+        parts.append((template[position:], None))
+        self.parts = [part for part in parts if part[0]]
+        self.text = "".join(text for text, _ in parts) if all(name is None for _, name in parts) else None
+
+    def format(self, **kwargs) -> str:
+        if self.text is not None:
+            return self.text
+        return "".join(text if name is None or name not in kwargs else str(kwargs[name]) for text, name in self.parts)
+
+
+def _one_other(n: float) -> str:
+    return "one" if n == 1 else "other"
+
+
+def _polish(n: float) -> str:
+    if n == 1:
+        return "one"
+    if n % 10 in (2, 3, 4) and n % 100 not in (12, 13, 14):
+        return "few"
+    return "many"
+
+
+def _russian(n: float) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        return "one"
+    if n % 10 in (2, 3, 4) and n % 100 not in (12, 13, 14):
+        return "few"
+    return "many"
+
+
+PLURAL_RULES = {
+    "EN": _one_other,
+    "DE": _one_other,
+    "ES": _one_other,
+    "PL": _polish,
+    "RU": _russian,
+    "SHORT": lambda n: "other",
+}
+"""Plural category (CLDR) of number per language"""
+CATEGORIES = {"one": 0, "few": 1, "many": 2, "other": 1}
+"""Index of word form per category in `UNITS` tables"""
+
+
+def plural(number: float, forms: tuple[str, ...], lang: str = "EN") -> str:
+    """Picks one of (singular, plural) or, for Slavic languages, (singular, few, many) forms"""
+    category = PLURAL_RULES.get(lang.upper(), _one_other)(number)
+    return forms[min(CATEGORIES[category], len(forms) - 1)]
+
+
+def _pluralize(translation: dict, count: float, language: str):
+    """Form of translation for count, chosen by language's plural rule and then `i18n`'s generic one"""
+    if count == 0 and "zero" in translation:
+        return translation["zero"]
+    if (rule := PLURAL_RULES.get(language.upper())) and (category := rule(count)) in translation:
+        return translation[category]
+    if count == 1 and "one" in translation:
+        return translation["one"]
+    if 1 < count <= config.get("plural_few") and "few" in translation:
+        return translation["few"]
+    for category in ("other", "many"):
+        if category in translation:
+            return translation[category]
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _lookup(key: str, language: str) -> Template | dict[str, Template] | None:
+    full_key = f"{language}.{key}"
+    locales = dict.fromkeys([config.get("locale"), config.get("fallback")])
+    for locale in locales:
+        if not translations.has(full_key, locale):
+            resource_loader.search_translation(full_key, locale)
+        if translations.has(full_key, locale):
+            translation = translations.get(full_key, locale)
+            if type(translation) is dict:
+                return {category: Template(value) for category, value in translation.items()}
+            return Template(translation)
+    return None
+
+
+def clear_cache():
+    _lookup.cache_clear()
+    _seconds_to_text.cache_clear()
+
+
+def _translate(key: str, language: str, kwargs: dict) -> str | None:
+    translation = _lookup(key, language)
+    if type(translation) is dict:
+        translation = _pluralize(translation, kwargs.get("count", 0), language)
+    if translation is None:
+        return None
+    return translation.format(**kwargs)
+
+
+def tr(key, language="en", **kwargs):
+    if (result := _translate(key, language, kwargs)) is not None:
+        return result
+    if "default" in kwargs:
+        return kwargs["default"]
+    if config.get("error_on_missing_translation"):
+        raise KeyError(f"key {language}.{key} not found")
+    return f"{language}.{key}"
+
 
 def check_translation(k, l, default, **kwargs):
-    _k = tr(k, l, **kwargs)
-    if _k == l + '.' + k or _k == '':
-        return default
-    return _k
+    """Translation or default if it's missing or empty"""
+    return _translate(k, l, kwargs) or default
+
 
 def pluralizeRussian(number, nom_sing, gen_sing, gen_pl):
-    s_last_digit = str(number)[-1]
-
-    if int(str(number)[-2:]) in range(11,20):
-        #11-19
-        return gen_pl
-    elif s_last_digit == '1':
-        #1
-        return nom_sing
-    elif int(s_last_digit) in range(2,5):
-        #2,3,4
-        return gen_sing
-    else:
-        #5,6,7,8,9,0
-        return gen_pl
+    return plural(number, (nom_sing, gen_sing, gen_pl), "RU")
+
+
+UNITS = {
+    "EN": {
+        "weeks": ("week", "weeks"),
+        "days": ("day", "days"),
+        "hours": ("hour", "hours"),
+        "minutes": ("minute", "minutes"),
+        "seconds": ("second", "seconds"),
+    },
+    "SHORT": {"weeks": ("w",), "days": ("d",), "hours": ("h",), "minutes": ("m",), "seconds": ("s",)},
+    "ES": {
+        "weeks": ("w",),
+        "days": ("día", "días"),
+        "hours": ("hora", "horas"),
+        "minutes": ("minuto", "minutos"),
+        "seconds": ("segundo", "segundos"),
+    },
+    "DE": {
+        "weeks": ("w",),
+        "days": ("Tag", "Tage"),
+        "hours": ("Stunde", "Stunden"),
+        "minutes": ("Minute", "Minuten"),
+        "seconds": ("Sekunde", "Sekunden"),
+    },
+    "PL": {
+        "weeks": ("tydzień", "tygodnie", "tygodni"),
+        "days": ("dzień", "dni"),
+        "hours": ("godzina", "godziny", "godzin"),
+        "minutes": ("minuta", "minuty", "minut"),
+        "seconds": ("sekunda", "sekundy", "sekund"),
+    },
+    "RU": {
+        "weeks": ("w",),
+        "days": ("день", "дня", "дней"),
+        "hours": ("час", "часа", "часов"),
+        "minutes": ("минута", "минуты", "минут"),
+        "seconds": ("секунда", "секунды", "секунд"),
+    },
+}
+"""Word forms of time units per language (ordered as in `CATEGORIES`)"""
+
+
+UNIT_WORDS = {
+    lang: {
+        unit: {category: forms[min(i, len(forms) - 1)] for category, i in CATEGORIES.items()}
+        for unit, forms in units.items()
+    }
+    for lang, units in UNITS.items()
+}
+"""Word of time unit per plural category, per language"""
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _seconds_to_text(secs, lang: str) -> str:
+    weeks = secs // 604800
+    days = (secs - weeks * 604800) // 86400
+    hours = (secs - weeks * 604800 - days * 86400) // 3600
+    minutes = (secs - weeks * 604800 - days * 86400 - hours * 3600) // 60
+    seconds = secs - weeks * 604800 - days * 86400 - hours * 3600 - minutes * 60
+
+    lang = lang.upper()
+    words = UNIT_WORDS.get(lang) or UNIT_WORDS["EN"]
+    rule = PLURAL_RULES.get(lang, _one_other)
+    parts = []
+    if weeks:
+        parts.append(f"{weeks} {words['weeks'][rule(weeks)]}")
+    if days:
+        parts.append(f"{days} {words['days'][rule(days)]}")
+    if hours:
+        parts.append(f"{hours} {words['hours'][rule(hours)]}")
+    if minutes and not weeks:
+        parts.append(f"{minutes} {words['minutes'][rule(minutes)]}")
+    if seconds and not weeks and not days:
+        parts.append(f"{seconds} {words['seconds'][rule(seconds)]}")
+    return ", ".join(parts)
+
 
 def secondsToText(secs, lang="EN"):
-    weeks = secs//604800
-    days = (secs - weeks*604800)//86400
-    hours = (secs - weeks*604800 - days*86400)//3600
-    minutes = (secs - weeks*604800 - days*86400 - hours*3600)//60
-    seconds = secs - weeks*604800 - days*86400 - hours*3600 - minutes*60
-
-    weeks_text = "w"
-    if lang == 'SHORT':
-        days_text = "d"
-        hours_text = "h"
-        minutes_text = "m"
-        seconds_text = "s"
-    elif lang == "ES":
-        days_text = "día{}".format("s" if days!=1 else "")
-        hours_text = "hora{}".format("s" if hours!=1 else "")
-        minutes_text = "minuto{}".format("s" if minutes!=1 else "")
-        seconds_text = "segundo{}".format("s" if seconds!=1 else "")
-    elif lang == "PL":
-        weeks_text = "{}".format("tydzień" if weeks==1 else ("tygodnie" if abs(weeks) % 10 in [2,3,4] else "tygodni"))
-        days_text = "{}".format("dni" if days!=1 else "dzień")
-        hours_text = "godzin{}".format("a" if hours==1 else ("y" if abs(hours) % 10 in [2,3,4] and hours not in [12,13,14] else ""))
-        minutes_text = "minut{}".format("a" if minutes==1 else ("y" if abs(minutes) % 10 in [2,3,4] and minutes not in [12,13,14] else ""))
-        seconds_text = "sekund{}".format("a" if seconds==1 else ("y" if abs(seconds) % 10 in [2,3,4] and seconds not in [12,13,14] else ""))
-    elif lang == "DE":
-        days_text = "Tag{}".format("e" if days!=1 else "")
-        hours_text = "Stunde{}".format("n" if hours!=1 else "")
-        minutes_text = "Minute{}".format("n" if minutes!=1 else "")
-        seconds_text = "Sekunde{}".format("n" if seconds!=1 else "")
-    elif lang == "RU":
-        days_text = pluralizeRussian(days, "день", "дня", "дней")
-        hours_text = pluralizeRussian(hours, "час", "часа", "часов")
-        minutes_text = pluralizeRussian(minutes, "минута", "минуты", "минут")
-        seconds_text = pluralizeRussian(seconds, "секунда", "секунды", "секунд")
-        days_text = "день" if days == 1 else("дня" if abs(days) % 10 in [2, 3, 4] and days not in range(11, 20) else "дней")
-        hours_text = "час" if hours == 1 else("часа" if abs(hours) % 10 in [2, 3, 4] and hours not in range(11, 20) else "часов")
-        minutes_text = "минута" if minutes == 1 else("минуты" if abs(minutes) % 10 in [2, 3, 4] and minutes not in range(11, 20) else "минут")
-        seconds_text = "секунда" if seconds == 1 else("секунды" if abs(seconds) % 10 in [2, 3, 4] and seconds not in range(11, 20) else "секунд")
-    else:
-        weeks_text = "week{}".format("s" if weeks != 1 else "")
-        days_text = "day{}".format("s" if days!=1 else "")
-        hours_text = "hour{}".format("s" if hours!=1 else "")
-        minutes_text = "minute{}".format("s" if minutes!=1 else "")
-        seconds_text = "second{}".format("s" if seconds!=1 else "")
-
-    result = ", ".join(filter(lambda x: bool(x), [
-    "{0} {1}".format(weeks, weeks_text) if weeks else "",
-    "{0} {1}".format(days, days_text) if days else "",
-    "{0} {1}".format(hours, hours_text) if hours else "",
-    "{0} {1}".format(minutes, minutes_text) if minutes and not weeks else "",
-    "{0} {1}".format(seconds, seconds_text) if seconds and not weeks and not days else ""
-    ]))
-    return result
+    return _seconds_to_text(secs, lang)
+
+
+def format_durations(seconds: Iterable[float], lang: str = "EN") -> list[str]:
+    """`secondsToText` of each duration (list, NumPy array or any other iterable of seconds)"""
+    return [_seconds_to_text(secs, lang) for secs in seconds]
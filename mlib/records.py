@@ -0,0 +1,275 @@
+"""
+Records
+---
+In-memory query engine over list of dicts with optional hash (equality) and sorted (prefix and range) indexes.
+
+records = Records(rows, index=["id"], sorted_index=["name"])
+
+records.filter(id=5)
+
+records.filter(name=Prefix("abc"), score=Range(10, 20), description=Regex(r"\\bfoo"))
+"""
+
+import multiprocessing, re
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator
+
+MISSING = object()
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str, flags: int = 0) -> re.Pattern:
+    return re.compile(pattern, flags)
+
+
+class Predicate:
+    """Condition on value of single key"""
+
+    def match(self, value) -> bool:
+        raise NotImplementedError
+
+    def lookup(self, index: "HashIndex | SortedIndex") -> Iterable[int] | None:
+        """Positions of possibly matching records according to index or None if index can't be used"""
+        return None
+
+
+class Eq(Predicate):
+    def __init__(self, value):
+        self.value = value
+
+    def match(self, value) -> bool:
+        return value == self.value
+
+    def lookup(self, index):
+        if self.value is not None or isinstance(index, HashIndex):
+            return index.equal(self.value)
+
+
+class Regex(Predicate):
+    """Matches (searches) string values. Patterns are compiled once"""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.compiled = compile_pattern(pattern, flags)
+
+    def match(self, value) -> bool:
+        return type(value) is str and self.compiled.search(value) is not None
+
+
+class Prefix(Predicate):
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def match(self, value) -> bool:
+        return type(value) is str and value.startswith(self.prefix)
+
+    def lookup(self, index):
+        if isinstance(index, SortedIndex):
+            return index.prefix(self.prefix)
+
+
+class Range(Predicate):
+    """Value between `low` and `high` (inclusive), either can be omitted"""
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    def match(self, value) -> bool:
+        try:
+            return (self.low is None or value >= self.low) and (self.high is None or value <= self.high)
+        except TypeError:
+            return False
+
+    def lookup(self, index):
+        if isinstance(index, SortedIndex):
+            return index.range(self.low, self.high)
+
+
+class HashIndex:
+    """Positions of records per value of key"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.positions: dict[Any, list[int]] = {}
+        self.unhashable: list[int] = []
+
+    def build(self, records: list[dict]):
+        for position, record in enumerate(records):
+            self.add(position, record)
+
+    def add(self, position: int, record: dict):
+        if (value := record.get(self.key, MISSING)) is MISSING:
+            return
+        try:
+            self.positions.setdefault(value, []).append(position)
+        except TypeError:
+            self.unhashable.append(position)
+
+    def equal(self, value) -> Iterable[int]:
+        try:
+            positions = self.positions.get(value, [])
+        except TypeError:
+            return self.unhashable
+        if self.unhashable:
+            return sorted(chain(positions, self.unhashable))
+        return positions
+
+
+class SortedIndex:
+    """Values of key kept sorted (along with positions of their records) for prefix and range lookups.
+    Values have to be comparable with each other, None values aren't indexed"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.values = []
+        self.positions: list[int] = []
+
+    def build(self, records: list[dict]):
+        key = self.key
+        entries = sorted(
+            (value, position) for position, record in enumerate(records) if (value := record.get(key)) is not None
+        )
+        self.values = [value for value, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def add(self, position: int, record: dict):
+        if (value := record.get(self.key)) is None:
+            return
+        i = bisect_right(self.values, value)
+        self.values.insert(i, value)
+        self.positions.insert(i, position)
+
+    def equal(self, value) -> Iterable[int]:
+        return sorted(self.positions[bisect_left(self.values, value) : bisect_right(self.values, value)])
+
+    def range(self, low=None, high=None) -> Iterable[int]:
+        start = 0 if low is None else bisect_left(self.values, low)
+        end = len(self.values) if high is None else bisect_right(self.values, high)
+        return sorted(self.positions[start:end])
+
+    def prefix(self, prefix: str) -> Iterable[int]:
+        start = end = bisect_left(self.values, prefix)
+        while end < len(self.values) and self.values[end].startswith(prefix):
+            end += 1
+        return sorted(self.positions[start:end])
+
+
+def _predicate(condition) -> Predicate:
+    return condition if isinstance(condition, Predicate) else Eq(condition)
+
+
+def _matches(record: dict, predicates: list[tuple[str, Predicate]]) -> bool:
+    for key, predicate in predicates:
+        if (value := record.get(key, MISSING)) is MISSING or not predicate.match(value):
+            return False
+    return True
+
+
+SHARED: dict[int, list[dict]] = {}
+"""Records inherited by forked worker processes, so only ranges of positions have to be sent to them"""
+
+
+def _match_chunk(records: list[dict] | int, start: int, end: int, predicates: list[tuple[str, Predicate]]) -> list[int]:
+    if type(records) is int:
+        records = SHARED[records]
+    return [i for i in range(start, end) if _matches(records[i], predicates)]
+
+
+class Records:
+    """List of dicts queried by predicates on multiple keys.
+    Indexes are built once and kept up to date by `append`/`extend`.
+    Scans without usable index can be split across `processes` worker processes
+    in chunks of `chunk_size` records (predicates have to be picklable then)"""
+
+    def __init__(
+        self,
+        records: Iterable[dict] = (),
+        index: Iterable[str] = (),
+        sorted_index: Iterable[str] = (),
+        processes: int = None,
+        chunk_size: int = 10_000,
+    ):
+        self.records: list[dict] = records if type(records) is list else list(records)
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.indexes: dict[str, list[HashIndex | SortedIndex]] = {}
+        for key in index:
+            self.add_index(HashIndex(key))
+        for key in sorted_index:
+            self.add_index(SortedIndex(key))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.records)
+
+    def add_index(self, index: HashIndex | SortedIndex):
+        index.build(self.records)
+        self.indexes.setdefault(index.key, []).append(index)
+
+    def append(self, record: dict):
+        position = len(self.records)
+        self.records.append(record)
+        for indexes in self.indexes.values():
+            for index in indexes:
+                index.add(position, record)
+
+    def extend(self, records: Iterable[dict]):
+        for record in records:
+            self.append(record)
+
+    def _candidates(self, predicates: list[tuple[str, Predicate]]) -> Iterable[int] | None:
+        """Smallest set of positions narrowed down by indexes"""
+        best = None
+        for key, predicate in predicates:
+            for index in self.indexes.get(key, []):
+                positions = predicate.lookup(index)
+                if positions is not None and (best is None or len(positions) < len(best)):
+                    best = positions
+        return best
+
+    def filter(self, **conditions) -> Iterator[dict]:
+        """Lazily yields records matching all conditions (`Predicate` or value compared for equality) in order.
+        Records missing any of the keys don't match"""
+        predicates = [(key, _predicate(condition)) for key, condition in conditions.items()]
+        candidates = self._candidates(predicates)
+        if candidates is not None:
+            records = self.records
+            return (records[i] for i in candidates if _matches(records[i], predicates))
+        if self.processes and len(self.records) > self.chunk_size:
+            return self._filter_parallel(predicates)
+        return (record for record in self.records if _matches(record, predicates))
+
+    def _filter_parallel(self, predicates: list[tuple[str, Predicate]]) -> Iterator[dict]:
+        records, chunk_size = self.records, self.chunk_size
+        starts = range(0, len(records), chunk_size)
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        if fork:
+            SHARED[id(records)] = records
+            chunks = [(id(records), start, min(start + chunk_size, len(records))) for start in starts]
+        else:
+            chunks = [(chunk, 0, len(chunk)) for chunk in (records[start : start + chunk_size] for start in starts)]
+        try:
+            context = multiprocessing.get_context("fork") if fork else None
+            with ProcessPoolExecutor(self.processes, mp_context=context) as executor:
+                futures = [executor.submit(_match_chunk, *chunk, predicates) for chunk in chunks]
+                for start, future in zip(starts, futures):
+                    # Positions are relative to chunk unless records were shared
+                    offset = 0 if fork else start
+                    for i in future.result():
+                        yield records[offset + i]
+        finally:
+            SHARED.pop(id(records), None)
+
+    def first(self, **conditions) -> dict | None:
+        return next(self.filter(**conditions), None)
+
+    def count(self, **conditions) -> int:
+        return sum(1 for _ in self.filter(**conditions))
+
+    def page(self, offset: int, limit: int, **conditions) -> list[dict]:
+        return list(islice(self.filter(**conditions), offset, offset + limit))
@@ -1,15 +1,5 @@
-def timed(func):
-    def inner(*args, **kwargs):
-        import time
-        sum_seconds = 0.0
-        start = time.perf_counter_ns()
-        result = func(*args, **kwargs)
-        finish = time.perf_counter_ns()
-        delta = (finish - start)
-        sum_seconds += delta
-        print(f"Time for {func.__name__}: {delta}")
-        return result
-    return inner
+# Moved to .metrics, kept importable from utils
+from .metrics import timed  # noqa: F401
 
 def replace_multiple(mainString: str, toBeReplaces: list, newString: str) -> str:
     # Iterate over the strings to be replaced
@@ -23,6 +13,72 @@ def replace_multiple(mainString: str, toBeReplaces: list, newString: str) -> str
 
 replaceMultiple = replace_multiple
 
+import re
+from functools import lru_cache
+from typing import IO, Any, Callable, Iterable, Iterator
+
+def _trie_regex(patterns: Iterable[str]) -> str:
+    """Regex matching any of patterns, preferring longest one (through greedy optional groups of shared prefix trie)"""
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+class Replacer:
+    """Replaces all patterns in single pass over text.
+    At each position longest matching pattern wins, so result doesn't depend on patterns' order
+
+    >>> Replacer(["cat", "category"], "*")("category of cats")
+    '* of *s'
+    >>> Replacer({"a": "b", "b": "a"})("abba")
+    'baab'
+    """
+    def __init__(self, patterns: Iterable[str] | dict[str, str], replacement: str = ""):
+        if isinstance(patterns, dict):
+            self.mapping = {k: v for k, v in patterns.items() if k}
+        else:
+            self.mapping = {k: replacement for k in patterns if k}
+        self.pattern = re.compile(_trie_regex(self.mapping)) if self.mapping else None
+        if len(replacements := set(self.mapping.values())) == 1:
+            # Same replacement for every pattern, escaped to be used as template directly
+            self._replacement = replacements.pop().replace("\\", "\\\\")
+        else:
+            self._replacement = lambda match: self.mapping[match.group()]
+
+    def __call__(self, text: str) -> str:
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(self._replacement, text)
+
+    replace = __call__
+
+    def replace_all(self, texts: Iterable[str]) -> list[str]:
+        """Replaces patterns in each of texts"""
+        return [self(text) for text in texts]
+
+@lru_cache(maxsize=128)
+def _cached_replacer(patterns: frozenset | tuple, replacement: str) -> Replacer:
+    return Replacer(dict(patterns) if type(patterns) is tuple else patterns, replacement)
+
+def compile_replacer(patterns: Iterable[str] | dict[str, str], replacement: str = "") -> Replacer:
+    """Returns (cached per set of patterns) `Replacer`"""
+    if isinstance(patterns, dict):
+        return _cached_replacer(tuple(sorted(patterns.items())), replacement)
+    return _cached_replacer(frozenset(patterns), replacement)
+
 def truncate(n: int, decimals: int=0):
     m = 10**decimals
     return int(n * m) / m
@@ -46,16 +102,17 @@ def grouper(iterable: list, n: int, fillvalue=None):
     args = [iter(iterable)] * n
     return zip_longest(*args, fillvalue=fillvalue)
 
-def filtr(array: list, regex: str, key: str):
-    import re
-    pattern = re.compile(regex)
-    not_matching = []
-    for i in array:
-        if pattern.search(i[key]) != None:
-            not_matching.append(i)
-    return not_matching
+def filtr(array: list, regex: str, key: str) -> list:
+    """Returns items which value under key matches regex (see `mlib.records` for indexed and multi-key queries)"""
+    from .records import Records, Regex
+    return list(Records(array).filter(**{key: Regex(regex)}))
 
 def chunks(array: list, max_chunks: int):
+    """Slices of sequence (or lists of other iterables, see `mlib.chunking`) of up to max_chunks items"""
+    if not hasattr(array, "__getitem__") or not hasattr(array, "__len__") or isinstance(array, dict):
+        from .chunking import chunked
+        yield from chunked(array, max_chunks)
+        return
     for i in range(0, len(array), max_chunks):
         yield array[i:i+max_chunks]
 
@@ -72,8 +129,10 @@ def total_characters(dictonary: dict):
 
 from typing import Set
 def all_subclasses(cls) -> Set[object]:
-    '''Returns all imported subclasses for provided class'''
-    return set(cls.__subclasses__()).union([s for c in cls.__subclasses__() for s in all_subclasses(c)])
+    '''Returns new set of all imported subclasses for provided class.
+    Use `subclasses()` of `mlib.classes.Registry` subclasses directly for lookups without copying'''
+    from .classes import subclasses
+    return set(subclasses(cls))
 
 def percent_of(value: float, percentage: float) -> float:
     return value * (percentage / 100)
@@ -93,21 +152,221 @@ def set_bit(result: int, value: int) -> int:
 def clear_bit(result: int, value: int) -> int:
     return result & ~value
 
-def remove_None(d):
-    if type(d) is list:
-        _d = []
-        for _i in d:
-            _d.append(remove_None(_i))
-        return _d
-    for k, a in d.copy().items():
-        if a is None:
-            d.pop(k, None)
-        elif type(a) is dict:
-            d[k] = remove_None(a)
-        elif type(a) is list:
-            d[k] = [remove_None(i) if type(i) is dict else i for i in a]
+CONTAINERS = frozenset({dict, list, tuple, set, frozenset})
+
+def is_None(value) -> bool:
+    return value is None
+
+def is_empty(value) -> bool:
+    """None or empty container"""
+    return value is None or (type(value) in CONTAINERS and not value)
+
+CYCLE_CHECK_DEPTH = 4096
+"""Nesting depth at which `remove_None` starts checking for circular references (which would nest infinitely)"""
+
+def _check_cycle(stack: list):
+    if len(stack) % CYCLE_CHECK_DEPTH == 0 and len({id(frame[0]) for frame in stack}) != len(stack):
+        raise ValueError("Circular reference detected")
+
+def _remove_None_inplace(d, sequences: bool):
+    """Pre-order walk for default predicate, as containers are never removed there, so they can be cleaned
+    before their children. Tuples and sets are rebuilt by `remove_None`"""
+    containers = CONTAINERS
+    stack = [d]
+    seen = set()
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if type(value) is dict:
+            dead = None
+            for key, item in value.items():
+                if item is None:
+                    if dead is None:
+                        dead = []
+                    dead.append(key)
+                elif type(item) in containers:
+                    if type(item) is dict or type(item) is list:
+                        stack.append(item)
+                    else:
+                        value[key] = remove_None(item, True, is_None, sequences)
+            if dead:
+                for key in dead:
+                    del value[key]
+        else:
+            if sequences and None in value:
+                value[:] = [item for item in value if item is not None]
+            for i, item in enumerate(value):
+                if type(item) in containers:
+                    if type(item) is dict or type(item) is list:
+                        stack.append(item)
+                    else:
+                        value[i] = remove_None(item, True, is_None, sequences)
     return d
 
+def remove_None(d, inplace: bool = True, drop: Callable[[Any], bool] = is_None, sequences: bool = False):
+    """Removes values of dicts (and items of lists, tuples and sets if `sequences`) for which `drop` is True.
+    Nested containers are cleaned before being checked, so `drop=is_empty` also removes ones left empty.
+    Walks iteratively, so depth isn't limited by recursion limit. With `inplace`, dicts and lists are modified
+    instead of copied (tuples and sets are always rebuilt)"""
+    if type(d) not in CONTAINERS:
+        return d
+    default = drop is is_None
+    if default and inplace and (type(d) is dict or type(d) is list):
+        return _remove_None_inplace(d, sequences)
+    containers = CONTAINERS
+    # Frame: [container, iterator, key in parent, output, write index]
+    # In-place dicts collect keys to delete, in-place lists are compacted up to write index (output is None),
+    # everything else collects kept items into new dict/list
+    if type(d) is dict:
+        stack = [[d, iter(d.items()), None, [] if inplace else {}, 0]]
+    else:
+        stack = [[d, iter(d), None, None if inplace and type(d) is list else [], 0]]
+    while True:
+        frame = stack[-1]
+        source, items, _, out, write = frame
+        child = None
+        if type(source) is dict:
+            for key, value in items:
+                if type(value) in containers:
+                    child = value
+                    break
+                if value is None if default else drop(value):
+                    if inplace:
+                        out.append(key)
+                elif not inplace:
+                    out[key] = value
+        else:
+            key = None
+            for value in items:
+                if type(value) in containers:
+                    child = value
+                    break
+                if sequences and (value is None if default else drop(value)):
+                    continue
+                if out is None:
+                    source[write] = value
+                    write += 1
+                else:
+                    out.append(value)
+            frame[4] = write
+
+        if child is not None:
+            if type(child) is dict:
+                stack.append([child, iter(child.items()), key, [] if inplace else {}, 0])
+            else:
+                stack.append([child, iter(child), key, None if inplace and type(child) is list else [], 0])
+            if len(stack) >= CYCLE_CHECK_DEPTH:
+                _check_cycle(stack)
+            continue
+
+        stack.pop()
+        kind = type(source)
+        if kind is dict:
+            if inplace:
+                for key in out:
+                    del source[key]
+                result = source
+            else:
+                result = out
+        elif out is None:
+            del source[write:]
+            result = source
+        else:
+            result = out if kind is list else kind(out)
+        if not stack:
+            return result
+
+        parent = stack[-1]
+        parent_source, key, parent_out = parent[0], frame[2], parent[3]
+        if type(parent_source) is dict:
+            if not default and drop(result):
+                if inplace:
+                    parent_out.append(key)
+            elif not inplace:
+                parent_out[key] = result
+            elif parent_source[key] is not result:
+                parent_source[key] = result
+        elif not (sequences and not default and drop(result)):
+            if parent_out is None:
+                parent_source[parent[4]] = result
+                parent[4] += 1
+            else:
+                parent_out.append(result)
+
+def iter_json(obj, drop: Callable[[Any], bool] = is_None, sequences: bool = False, default: Callable = None, chunk_size: int = 4096) -> Iterator[str]:
+    """Encodes `obj` as JSON chunks (of about `chunk_size` tokens) skipping values that would be removed by `remove_None`,
+    without building cleaned copy. Unlike `remove_None`, `drop` sees containers before they are filtered
+    (so dicts consisting only of None are kept as `{}`)"""
+    from json import JSONEncoder
+    from json.encoder import encode_basestring_ascii as encode_str
+    encode = JSONEncoder(default=default, check_circular=False).encode
+    containers = CONTAINERS
+    infinity = float("inf")
+
+    def scalar(value) -> str:
+        kind = type(value)
+        if kind is str:
+            return encode_str(value)
+        if value is None:
+            return "null"
+        if kind is bool:
+            return "true" if value else "false"
+        if kind is int:
+            return int.__repr__(value)
+        if kind is float and -infinity < value < infinity:
+            return float.__repr__(value)
+        return encode(value)
+
+    def push(value):
+        if type(value) is dict:
+            stack.append((value, iter(value.items()), True))
+            parts.append("{")
+        else:
+            stack.append((value, iter(value), False))
+            parts.append("[")
+        if len(stack) >= CYCLE_CHECK_DEPTH:
+            _check_cycle(stack)
+
+    if type(obj) not in containers:
+        yield scalar(obj)
+        return
+    stack, parts = [], []
+    push(obj)
+    first = True
+    while stack:
+        _, items, is_dict = stack[-1]
+        filtering = is_dict or sequences
+        for item in items:
+            key, value = item if is_dict else (None, item)
+            if filtering and drop(value):
+                continue
+            if not first:
+                parts.append(",")
+            if is_dict:
+                parts.append(encode_str(key) if type(key) is str else '"' + scalar(key).strip('"') + '"')
+                parts.append(":")
+            if type(value) in containers:
+                push(value)
+                first = True
+                break
+            parts.append(scalar(value))
+            first = False
+        else:
+            stack.pop()
+            parts.append("}" if is_dict else "]")
+            first = False
+        if len(parts) >= chunk_size:
+            yield "".join(parts)
+            parts = []
+    yield "".join(parts)
+
+def dump_json(obj, file: IO[str], drop: Callable[[Any], bool] = is_None, sequences: bool = False, default: Callable = None):
+    """Writes `obj` as JSON to `file` skipping dropped values (see `iter_json`)"""
+    for chunk in iter_json(obj, drop, sequences, default):
+        file.write(chunk)
+
 def cap(word: str):
     '''CapitalizedRestINTACT'''
     if word == '':
@@ -118,29 +377,8 @@ def title_preserving_caps(string, whitespace=' '):
     '''Title PRESERVING CaPS'''
     return whitespace.join(map(cap, string.split(whitespace)))
 
-def cc2jl(my_str):
-  """CamelCase to joint_lower"""
-
-  r = my_str[0].lower()
-  for i, letter in enumerate(my_str[1:], 1):
-    if letter.isupper():
-      if my_str[i-1].islower() or (i != len(my_str)-1 and my_str[i+1].islower()):
-        r += '_'
-    r += letter.lower()
-  return r
-
-def cc2jp(my_str):
-  """CamelCase to joint_lower_Preserving_Uppercase"""
-  my_str = str(my_str)
-
-  r = my_str[0]
-  for i, letter in enumerate(my_str[1:], 1):
-    if letter.isupper():
-      if my_str[i-1].islower() or (i != len(my_str)-1 and my_str[i+1].islower()):
-          if my_str[i-1] not in ['_','"',"'"] and my_str[i+1] not in ['_','"',"'"]:
-            r += '_'
-    r += letter
-  return r.strip('_')
+# Case conversion moved to .case, names kept importable from utils
+from .case import cc2jl, cc2jp, cc2kebab, cc2snake, convert_keys, to_camel, to_case, to_kebab, to_snake  # noqa: F401
 
 from .types import Enum
 class Case_Separators(Enum):
@@ -151,22 +389,9 @@ class Case_Separators(Enum):
     def to(cls, my_str: str):
         return to_case(my_str, cls.value)
 
-
-def to_case(my_str: str, separator: str) -> str:
-    """String to-any_case"""
-    return my_str.replace(" ", separator).replace("-", separator).replace("_", separator)
-
-def to_snake(my_str: str) -> str:
-    """String to snake_case"""
-    return my_str.replace(" ","_").replace("-","_").lower()
-
-def to_kebab(my_str: str) -> str:
-    """String to kebab-case"""
-    return my_str.replace(" ", "-").replace("_", "-").lower()
-
-def to_camel(my_str: str, default_separator: str="_") -> str:
-    """snake_case (or any other by changing default separator) to CamelCase"""
-    return "".join(i.title() for i in my_str.split(default_separator))
+    def convert(cls, my_str: str) -> str:
+        """Converts (CamelCase too) to CamelCase, snake_case or kebab-case"""
+        return {"": to_camel, "_": cc2snake, "-": cc2kebab}[cls.value](my_str)
 
 
 def try_quote(my_str: str) -> int | str:
@@ -192,8 +417,6 @@ def unquote(my_str: str) -> str:
     """Removes surrounding quotes (" or ')"""
     return my_str.replace('"',"").replace("'","").replace('`', '')
 
-import re
-
 NOT_WORD_OR_DIGIT = re.compile(r"\W|^(?=\d)")
 def clean(my_str) -> str:
     """Replaces any non word characters or digits with underscore"""
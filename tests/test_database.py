@@ -0,0 +1,399 @@
+import asyncio, enum, random, tracemalloc, uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from mlib.database import (
+    CACHES,
+    ID,
+    SQL,
+    AsyncSQL,
+    Base,
+    Default,
+    Timestamp,
+    decode_cursor,
+    encode_cursor,
+    evict,
+    hashable,
+)
+
+
+class Ref(Base):
+    id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+
+
+class Tag(Default, Base):
+    pass
+
+
+class Parent(Default, Base):
+    pass
+
+
+class Child(ID, Base):
+    parent_id: orm.Mapped[int | None] = orm.mapped_column(sa.ForeignKey("Parent.id"), default=None)
+    parent: orm.Mapped[Parent | None] = orm.relationship(default=None)
+
+
+class Event(ID, Timestamp, Base):
+    pass
+
+
+class Color(enum.Enum):
+    red = 1
+    green = 2
+    blue = 3
+
+
+class Item(ID, Base):
+    code: orm.Mapped[uuid.UUID] = orm.mapped_column(default_factory=uuid.uuid4)
+    price: orm.Mapped[Decimal] = orm.mapped_column(sa.Numeric(10, 2), default=Decimal("1.50"))
+    color: orm.Mapped[Color] = orm.mapped_column(default=Color.red)
+    rank: orm.Mapped[int | None] = orm.mapped_column(default=None)
+
+
+class Upper(sa.TypeDecorator):
+    """Type without `cache_ok`, making statements using it uncacheable"""
+
+    impl = sa.String
+
+    def process_bind_param(self, value, dialect):
+        return value.upper()
+
+
+class Shout(ID, Base):
+    text: orm.Mapped[str] = orm.mapped_column(Upper)
+
+
+class Cached(Default, Base, cache=True):
+    pass
+
+
+class Note(Base):
+    id: orm.Mapped[int] = orm.mapped_column(primary_key=True)
+    text: orm.Mapped[str] = orm.mapped_column()
+
+
+@pytest.fixture
+async def db(tmp_path):
+    db = AsyncSQL(url=f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    await db.create_tables()
+    yield db
+    await db.close()
+
+
+@pytest.fixture
+def replicated(tmp_path):
+    """Primary with two replicas, each holding single tag named after it"""
+    db = SQL(
+        url=f"sqlite:///{tmp_path / 'primary.db'}", replicas=[f"sqlite:///{tmp_path / f'{name}.db'}" for name in "ab"]
+    )
+    for name, engine in zip(["primary", "a", "b"], db._sync_engines()):
+        Base.metadata.create_all(engine)
+        with orm.Session(engine) as s, s.begin():
+            s.add(Tag(name))
+    yield db
+    for engine in db._sync_engines():
+        engine.dispose()
+
+
+def read(session) -> str:
+    return session.scalar(sa.select(Tag.name).order_by(Tag.id))
+
+
+@contextmanager
+def statements(engine):
+    """Collects SQL of statements executed by engine"""
+    executed = []
+
+    def before_execute(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    engine = getattr(engine, "sync_engine", engine)
+    sa.event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        yield executed
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", before_execute)
+
+
+async def test_fetch_or_add_multiple_bulk_statements_constant(db):
+    counts = []
+    for amount in (10, 500):
+        async with db.session() as s:
+            await Ref.fetch_or_add_multiple(s, *range(amount // 2), bulk=True)
+            await s.commit()
+        async with db.session() as s:
+            with statements(db._engine) as executed:
+                rows = await Ref.fetch_or_add_multiple(s, *range(amount), bulk=True)
+            assert [row.id for row in rows] == list(range(amount))
+        counts.append(len(executed))
+        async with db.session.begin() as s:
+            await s.execute(sa.delete(Ref))
+    assert counts[0] == counts[1] == 3
+
+
+async def test_fetch_or_add_multiple_bulk_order_and_duplicates(db):
+    async with db.session() as s:
+        await Ref.fetch_or_add_multiple(s, 3, bulk=True)
+        rows = await Ref.fetch_or_add_multiple(s, 5, 3, 5, 1, 3, bulk=True)
+        assert [row.id for row in rows] == [5, 3, 5, 1, 3]
+        assert rows[0] is rows[2] and rows[1] is rows[4]
+
+
+async def test_fetch_or_add_multiple_bulk_conflicts(db, monkeypatch):
+    async with db.session.begin() as s:
+        s.add_all([Ref(1), Ref(2)])
+
+    fetch_in = Ref._fetch_in.__func__
+    calls = []
+
+    async def stale_fetch_in(cls, session, ids, chunk_size):
+        """First lookup misses rows inserted meanwhile by someone else"""
+        calls.append(ids)
+        return {} if len(calls) == 1 else await fetch_in(cls, session, ids, chunk_size)
+
+    monkeypatch.setattr(Ref, "_fetch_in", classmethod(stale_fetch_in))
+    async with db.session() as s:
+        with statements(db._engine) as executed:
+            rows = await Ref.fetch_or_add_multiple(s, 2, 3, 1, bulk=True)
+        assert [row.id for row in rows] == [2, 3, 1]
+        await s.commit()
+    assert any("ON CONFLICT" in statement for statement in executed)
+    async with db.session() as s:
+        assert sorted(row.id for row in await Ref.filter(s)) == [1, 2, 3]
+
+
+async def create_tag(db, name: str, commit: bool = True) -> int | None:
+    async with db.session() as s:
+        tag = await Tag.fetch_or_add(s, name=name)
+        await asyncio.sleep(0.05)
+        if not commit:
+            await s.rollback()
+            return None
+        await s.flush()
+        id = tag.id
+        await s.commit()
+        return id
+
+
+async def test_coalesce_doesnt_share_uncommitted_rows(db):
+    assert await asyncio.gather(create_tag(db, "x", commit=False), create_tag(db, "x")) == [None, 1]
+    async with db.session() as s:
+        assert [tag.name for tag in await Tag.filter(s)] == ["x"]
+
+
+async def test_fetch_or_add_across_sessions(db):
+    ids = await asyncio.gather(*(create_tag(db, "dup") for _ in range(5)))
+    assert len(set(ids)) == 1
+    async with db.session() as s:
+        assert [tag.name for tag in await Tag.filter(s)] == ["dup"]
+
+
+async def test_coalesce_shares_within_session(db):
+    async with db.session() as s:
+        first, second = await asyncio.gather(Tag.fetch_or_add(s, name="y"), Tag.fetch_or_add(s, name="y"))
+        assert first is second
+        await s.commit()
+    async with db.session() as a, db.session() as b:
+        tag_a, tag_b = await asyncio.gather(Tag.by_name(a, "y"), Tag.by_name(b, "y"))
+        assert tag_a.id == tag_b.id and tag_a is not tag_b
+        assert tag_b in b
+
+
+def test_hashable_unhashable_parts():
+    assert hashable(Tag, "fetch_or_add", {"name": "x"}) == (Tag, "fetch_or_add", frozenset({("name", "x")}))
+    assert hashable(Tag, "fetch_or_add", {"name": ["x"]}) is None
+
+
+async def test_stream_batches(db):
+    await db.upsert_many(Note, [{"id": i, "text": str(i)} for i in range(25)])
+    async with db.session() as s:
+        rows = [note.id async for note in s.stream_batches(sa.select(Note).order_by(Note.id), batch_size=10)]
+        assert rows == list(range(25))
+        partitions = [len(partition) async for partition in Note.iter_filter(s, batch_size=10, partitions=True)]
+        assert partitions == [10, 10, 5]
+
+
+async def test_stream_batches_bounded_memory(db):
+    await db.upsert_many(Note, ({"id": i, "text": "x" * 200 + str(i)} for i in range(20_000)))
+
+    async def peak(consume) -> int:
+        async with db.session() as s:
+            tracemalloc.start()
+            try:
+                await consume(s)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    async def load(s):
+        assert len(await Note.filter(s)) == 20_000
+
+    async def stream(s):
+        assert sum([1 async for _ in Note.iter_filter(s, batch_size=500)]) == 20_000
+
+    assert await peak(stream) * 4 < await peak(load)
+
+
+async def test_filter_by_relationship(db):
+    async with db.session() as s:
+        parent = await Parent.fetch_or_add(s, name="p")
+        child = await Child.fetch_or_add(s, parent=parent)
+        await s.flush()
+        assert await Child.filter(s, parent=parent) == [child]
+        assert await Child.fetch_or_add(s, parent=parent) is child
+        assert await Child.filter(s, parent_id=parent.id) == [child]
+
+
+async def test_query_stats_rows(db):
+    stats = db.instrument()
+    await db.upsert_many(Note, [{"id": i, "text": str(i)} for i in range(50)])
+    async with db.session() as s:
+        assert len(await Note.filter(s)) == 50
+        assert len(await Note.filter(s, text="1")) == 1
+    rows = {sql: entry["rows"] for sql, entry in stats.snapshot()["statements"].items()}
+    assert sorted(rows[sql] for sql in rows if sql.startswith("SELECT")) == [1, 50]
+    assert [rows[sql] for sql in rows if sql.startswith("INSERT")] == [50]
+
+    async with db._engine.connect() as conn:
+        with pytest.raises(sa.exc.OperationalError):
+            await conn.execute(sa.text("SELECT * FROM missing"))
+        assert conn.sync_connection.info["mlib_query_start"] == []
+
+
+async def test_iter_pages_timestamp(db):
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    async with db.session.begin() as s:
+        s.add_all([Event() for _ in range(15)])
+        s.add_all([Event(timestamp=start + timedelta(microseconds=i * 500_000)) for i in range(10)])
+    async with db.session() as s:
+        events = await Event.filter(s)
+        for order_by, descending in [(["-timestamp"], True), (["timestamp"], False)]:
+            expected = sorted(events, key=lambda event: event.id)
+            expected.sort(key=lambda event: event.timestamp, reverse=descending)
+            pages = [page async for page in Event.iter_pages(s, order_by=order_by, page_size=10)]
+            assert [len(page) for page in pages] == [10, 10, 5]
+            assert [event.id for page in pages for event in page] == [event.id for event in expected]
+
+
+def test_cursor_types():
+    values = [uuid.uuid4(), Decimal("1.10"), Color.green, None, datetime(2026, 1, 1, 12, 30), 1.5, "text"]
+    assert decode_cursor(encode_cursor(values)) == [values[0], values[1], "green", *values[3:]]
+    with pytest.raises(TypeError):
+        encode_cursor([object()])
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([{"$n": "not a number"}]))
+
+
+async def test_iter_pages_types_and_nulls(db):
+    rng = random.Random(0)
+    async with db.session.begin() as s:
+        s.add_all(
+            [
+                Item(
+                    price=Decimal(rng.randint(1, 5)) / 2,
+                    color=rng.choice(list(Color)),
+                    rank=rng.choice([None, 1, 2, 3]),
+                )
+                for _ in range(40)
+            ]
+        )
+    keys = {"code": lambda item: item.code.hex, "color": lambda item: item.color.name}
+    async with db.session() as s:
+        items = await Item.filter(s)
+        for order_by in [["rank"], ["-rank"], ["code"], ["-price"], ["color", "-rank"], ["-rank", "price"]]:
+            expected = sorted(items, key=lambda item: item.id)
+            for column in reversed(order_by):
+                name = column.lstrip("-")
+                key = keys.get(name, lambda item: getattr(item, name))
+                # NULLs after all values: last when ascending, first when descending
+                expected.sort(key=lambda item: (key(item) is None, key(item) or 0), reverse=column.startswith("-"))
+            pages = [page async for page in Item.iter_pages(s, order_by=order_by, page_size=7)]
+            assert [item.id for page in pages for item in page] == [item.id for item in expected], order_by
+
+
+async def test_iter_pages_without_progress(db, monkeypatch):
+    async def paginate(cls, session, *filters, **kwargs):
+        return [None], "cursor"
+
+    monkeypatch.setattr(Event, "paginate", classmethod(paginate))
+    async with db.session() as s:
+        with pytest.raises(RuntimeError):
+            async for _ in Event.iter_pages(s):
+                pass
+
+
+def test_replica_pinned_per_transaction(replicated):
+    seen = set()
+    for _ in range(50):
+        with replicated.session() as s:
+            reads = {read(s) for _ in range(20)}
+            assert len(reads) == 1 and reads < {"a", "b"}
+            s.commit()
+            seen |= reads | {read(s)}
+    assert seen == {"a", "b"}
+
+
+def test_replica_primary_after_write(replicated):
+    with replicated.session() as s:
+        assert read(s) in {"a", "b"}
+        s.add(Tag("new"))
+        s.flush()
+        assert read(s) == "primary"
+        assert s.scalar(sa.select(Tag.id).where(Tag.name == "new")) is not None
+        s.commit()
+        assert read(s) == "primary"
+
+
+def test_replica_explicit_transaction(replicated):
+    with replicated.session() as s, s.begin():
+        assert read(s) == "primary"
+
+
+@pytest.mark.filterwarnings("ignore::sqlalchemy.exc.SAWarning")
+async def test_get_uncacheable_statement(db):
+    async with db.session() as s:
+        s.add(Shout("hey"))
+        await s.flush()
+        assert (await Shout.get(s, Shout.text == "hey")).text == "HEY"
+
+
+async def test_cache_skips_changes_within_session(db):
+    async with db.session.begin() as s:
+        s.add(Cached("a"))
+    async with db.session() as s:
+        row = await Cached.by_name(s, "a")
+        assert len(CACHES[Cached]) == 1
+        row.name = "b"
+        assert await Cached.by_name(s, "a") is None
+        await s.flush()
+        assert await Cached.by_name(s, "a") is None
+        assert await Cached.by_name(s, "b") is row
+
+
+async def test_cache_not_filled_after_concurrent_eviction(db, monkeypatch):
+    async with db.session.begin() as s:
+        s.add(Cached("c"))
+    evict(Cached)
+    async with db.session() as s:
+        scalar = s.scalar
+
+        async def scalar_then_evict(*args, **kwargs):
+            row = await scalar(*args, **kwargs)
+            evict(Cached)
+            return row
+
+        monkeypatch.setattr(s, "scalar", scalar_then_evict)
+        assert (await Cached.by_name(s, "c")).name == "c"
+    assert len(CACHES[Cached]) == 0
+
+
+async def test_upsert_many_affected(db, monkeypatch):
+    assert await db.upsert_many(Note, [{"id": i, "text": str(i)} for i in range(5)], batch_size=2) == 5
+    monkeypatch.setattr(db._engine.dialect, "supports_sane_multi_rowcount", False)
+    assert await db.upsert_many(Note, [{"id": i, "text": "x"} for i in range(5)], batch_size=2) is None